@@ -1,3 +1,3 @@
-from .engine import alphazero_engine
+from .engine import alphazero_engine, load_engine, registry
 
-__all__ = ["alphazero_engine"]
+__all__ = ["alphazero_engine", "load_engine", "registry"]
@@ -0,0 +1,144 @@
+from pathlib import Path
+
+import numpy as np
+import torch
+
+BACKENDS = ("eager", "fused", "torchscript", "compile", "onnx", "int8", "onnx-int8")
+
+
+class TorchBackend:
+    def __init__(self, module, device):
+        self.module = module
+        self.device = device
+
+    def __call__(self, encoded):
+        return self.module(encoded)
+
+
+class OnnxBackend:
+    def __init__(self, path):
+        try:
+            import onnxruntime
+        except ImportError as error:
+            raise ImportError(
+                "the onnx backend needs onnxruntime: uv sync --extra onnx"
+            ) from error
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        self.session = onnxruntime.InferenceSession(
+            str(path), options, providers=["CPUExecutionProvider"]
+        )
+        self.device = torch.device("cpu")
+
+    def __call__(self, encoded):
+        policy, value = self.session.run(None, {"board": encoded.cpu().numpy()})
+        return torch.from_numpy(policy), torch.from_numpy(value)
+
+
+def example_input(model):
+    return torch.zeros((1, 3, 7, 7), device=model.device)
+
+
+def export(model, path, backend):
+    # Writes model in the format the backend loads: a frozen TorchScript
+    # module or an ONNX graph, both with a dynamic batch dimension.
+    model.eval()
+    with torch.no_grad():
+        if backend == "torchscript":
+            traced = torch.jit.trace(model, example_input(model))
+            torch.jit.save(torch.jit.freeze(traced), str(path))
+        elif backend == "onnx":
+            torch.onnx.export(
+                model,
+                (example_input(model),),
+                str(path),
+                input_names=["board"],
+                output_names=["policy", "value"],
+                dynamic_axes={"board": {0: "batch"}},
+                dynamo=False,
+            )
+        else:
+            raise ValueError(f"nothing to export for the {backend} backend")
+
+
+def load_backend(backend, model, path=None):
+    """Returns something that is called like model.
+
+    torchscript, onnx, int8 and onnx-int8 load from path, exporting model
+    there first if the file does not exist yet. The INT8 backends are
+    calibrated on self-play positions once, when their file is written; see
+    quantize.py.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend!r}, expected one of {BACKENDS}")
+    if backend == "eager":
+        return model
+    if backend == "fused":
+        from .quantize import fuse
+
+        return fuse(model)
+    if backend == "compile":
+        return TorchBackend(torch.compile(model, dynamic=True), model.device)
+
+    path = Path(path)
+    if not path.exists():
+        if backend in ("int8", "onnx-int8"):
+            from sidestacker import SideStacker
+            from .quantize import quantize_onnx, save_int8, selfplay_positions
+
+            game = SideStacker()
+            calibration = selfplay_positions(model, game)
+            if backend == "int8":
+                save_int8(model, path, calibration, game)
+            else:
+                quantize_onnx(model, path, calibration, game)
+        else:
+            export(model, path, backend)
+    if backend == "torchscript":
+        return TorchBackend(
+            torch.jit.load(str(path), map_location=model.device), model.device
+        )
+    if backend == "int8":
+        from .quantize import select_engine
+
+        select_engine()
+        cpu = torch.device("cpu")
+        return TorchBackend(torch.jit.load(str(path), map_location=cpu), cpu)
+    return OnnxBackend(path)
+
+
+def sample_positions(game, count=64, seed=0):
+    # Fixed positions from seeded random play, one per ply reached.
+    rng = np.random.default_rng(seed)
+    states = []
+    while len(states) < count:
+        position = game.get_position(game.get_initial_state())
+        while len(states) < count and not position.get_value_and_terminated()[1]:
+            position.play(int(rng.choice(position.moves)))
+            states.append(position.to_board())
+    return np.stack(states)
+
+
+@torch.no_grad()
+def compare(backend, model, states, game):
+    # Largest absolute differences in policy logits and value against model.
+    encoded = torch.tensor(game.get_encoded_state(states), device=model.device)
+    policy, value = backend(encoded)
+    expected_policy, expected_value = model(encoded)
+    return (
+        (policy.to(model.device) - expected_policy).abs().max().item(),
+        (value.to(model.device) - expected_value).abs().max().item(),
+    )
+
+
+def verify(backend, model, game, atol=1e-3):
+    policy_error, value_error = compare(backend, model, sample_positions(game), game)
+    if policy_error > atol or value_error > atol:
+        raise ValueError(
+            f"backend disagrees with the eager model: policy {policy_error:.2e},"
+            f" value {value_error:.2e}"
+        )
+    return policy_error, value_error
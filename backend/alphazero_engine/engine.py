@@ -1,12 +1,14 @@
+import logging
+import os
+import time
 import numpy as np
-import torch
 from pathlib import Path
 
 from sidestacker import SideStacker
-from .ResNet import ResNet
-from .mcts import MCTS
+from utils import LRUCache
+from .registry import Checkpoint, ModelRegistry
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+log = logging.getLogger("uvicorn")
 
 sideStacker = SideStacker()
 
@@ -15,14 +17,108 @@ args = {
     "num_searches": 1000,
     "dirichlet_epsilon": 0.0,
     "dirichlet_alpha": 0.3,
+    "tt_size": 100_000,
+    "reuse_games": 64,
+    "reuse_ttl": 600,
+    "threads": 1,
+    "early_stop": True,
+    "solver": True,
+    "eval_batch": 8,
+    "eval_cache_bytes": 64 * 2**20,
+    "inference_batch": 64,
+    "inference_wait": 0.002,
+    # eager, fused, torchscript, compile, onnx, int8 or onnx-int8; see backends.py.
+    "backend": os.getenv("ALPHAZERO_BACKEND", "eager"),
 }
 
-model = ResNet(sideStacker, 4, 64, device)
-model_path = Path("model_27.pt")
-model.load_state_dict(torch.load(model_path, map_location=device))
-model.eval()
+# Checkpoints are model_<version>.pt files in ALPHAZERO_MODELS, assigned per
+# difficulty level by ALPHAZERO_LEVELS, e.g. "hard=model_27,medium=12".
+model_dir = Path(os.getenv("ALPHAZERO_MODELS", "."))
+levels = dict(
+    level.split("=", 1)
+    for level in os.getenv("ALPHAZERO_LEVELS", "hard=model_27").split(",")
+)
 
-mcts = MCTS(sideStacker, args, model)
+trees = LRUCache(args["reuse_games"], args["reuse_ttl"])
+
+
+def load_model(path, device):
+    import torch
+
+    from .ResNet import ResNet
+
+    model = ResNet(sideStacker, 4, 64, device)
+    # Memory-mapped and assigned in place: on CPU the weights stay backed by
+    # the file's page cache, which every worker process shares.
+    state_dict = torch.load(
+        path, map_location=device, mmap=device.type == "cpu", weights_only=True
+    )
+    model.load_state_dict(state_dict, assign=True)
+    model.eval()
+    return model
+
+
+def load_checkpoint(name, path):
+    # torch and the model are only imported here, on the first move or from
+    # the app's lifespan hook, so importing this module stays cheap.
+    startup = {}
+    begin = time.perf_counter()
+    import torch
+
+    from .backends import load_backend, verify
+    from .inference import InferenceServer
+    from .mcts import MCTS
+    from .quantize import QUANTIZED_BACKENDS, check
+
+    startup["import"] = time.perf_counter() - begin
+
+    step = time.perf_counter()
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model = load_model(path, device)
+    startup["load"] = time.perf_counter() - step
+
+    step = time.perf_counter()
+    backend = load_backend(
+        args["backend"], model, path.with_suffix(f".{args['backend']}")
+    )
+    if args["backend"] in QUANTIZED_BACKENDS:
+        check(backend, model, sideStacker)
+    elif backend is not model:
+        verify(backend, model, sideStacker)
+    startup["backend"] = time.perf_counter() - step
+
+    # Every search on this checkpoint sends its forward passes through one
+    # server, which batches them across concurrent requests.
+    inference = InferenceServer(
+        backend, args["inference_batch"], args["inference_wait"]
+    )
+    step = time.perf_counter()
+    with torch.no_grad():
+        for batch_size in sorted({1, args["eval_batch"]}):
+            inference(torch.zeros((batch_size, 3, 7, 7), device=device))
+    startup["warmup"] = time.perf_counter() - step
+
+    mcts = MCTS(sideStacker, args, inference)
+    startup["total"] = time.perf_counter() - begin
+    log.info(
+        "alphazero %s ready in %.2fs (%s)",
+        name,
+        startup["total"],
+        ", ".join(
+            f"{stage} {seconds:.2f}s"
+            for stage, seconds in startup.items()
+            if stage != "total"
+        ),
+    )
+    return Checkpoint(name, model, backend, inference, mcts, startup)
+
+
+registry = ModelRegistry(model_dir, load_checkpoint, levels)
+
+
+def load_engine():
+    # Loads the checkpoint for every configured level up front.
+    return {level: registry.get(level) for level in list(registry.levels)}
 
 
 def convert_board(board, player_symbol):
@@ -38,10 +134,47 @@ def action_to_row_col(action: int, size=7):
     return row, col
 
 
-def alphazero_engine(board, player_symbol):
+def reuse_tree(game_id, state, checkpoint):
+    previous = trees.pop(game_id)
+    if previous is None:
+        return None
+
+    # A tree searched by a checkpoint that has since been swapped out is
+    # dropped rather than mixed with the new one's evaluations.
+    name, previous_state, root, action = previous
+    if name != checkpoint.name:
+        return None
+    moves = sideStacker.get_moves_between(previous_state, state)
+    if moves is None or moves[0] != action:
+        return None
+
+    node = root
+    for move in moves:
+        node = node.get_child(move)
+        if node is None:
+            return None
+    if not node.is_fully_expanded():
+        return None
+    node.parent = None
+    return node
+
+
+def alphazero_engine(
+    board, player_symbol, game_id=None, deadline=None, level="hard", cancel=None
+):
+    checkpoint = registry.get(level)
+    mcts = checkpoint.mcts
     state = convert_board(board, player_symbol)
     neutral_state = sideStacker.change_perspective(state, -1)
-    mcts_probs = mcts.search(neutral_state)
-    action = int(np.argmax(mcts_probs))
-    row, col = action_to_row_col(action)
-    return row, col
+
+    root = None
+    if game_id is not None:
+        root = reuse_tree(game_id, neutral_state, checkpoint)
+    if root is None:
+        root = mcts.new_root(neutral_state)
+
+    visits, searches = mcts.search_visits(neutral_state, root, deadline, cancel)
+    action = int(np.argmax(visits))
+    if game_id is not None:
+        trees.put(game_id, (checkpoint.name, neutral_state, root, action))
+    return action_to_row_col(action), searches, visits
@@ -0,0 +1,34 @@
+import sys
+
+import numpy as np
+
+from sidestacker.constants import SIZE
+from utils import LRUCache
+
+# Rough footprint of one entry: the float32 policy array plus the value, the
+# tuple holding them, the key and the cache's own bookkeeping.
+ENTRY_BYTES = sys.getsizeof(np.zeros(SIZE * SIZE, dtype=np.float32)) + 256
+
+
+class EvaluationCache(LRUCache):
+    """Masked, normalized policy and value per canonical position.
+
+    Policies are stored in the canonical orientation, so every mirror image of
+    a position shares one entry; callers map them back with the symmetry
+    from Position.canonical_symmetry.
+    """
+
+    def __init__(self, max_bytes: int):
+        super().__init__(max(1, max_bytes // ENTRY_BYTES))
+        self.max_bytes = max_bytes
+
+    def put(self, key, value):
+        policy, _ = value
+        policy.flags.writeable = False
+        super().put(key, value)
+
+    def stats(self):
+        stats = super().stats()
+        stats["bytes"] = stats["size"] * ENTRY_BYTES
+        stats["max_bytes"] = self.max_bytes
+        return stats
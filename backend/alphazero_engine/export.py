@@ -0,0 +1,38 @@
+"""Exports a checkpoint for the torchscript or onnx backend and checks the
+result against the eager model.
+
+Run from backend/: python -m alphazero_engine.export model_27.pt --backend onnx
+"""
+
+import argparse
+from pathlib import Path
+
+import torch
+
+from sidestacker import SideStacker
+from .ResNet import ResNet
+from .backends import compare, export, load_backend, sample_positions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("checkpoint", type=Path)
+    parser.add_argument("--backend", choices=("torchscript", "onnx"), default="onnx")
+    parser.add_argument("--output", type=Path)
+    options = parser.parse_args()
+
+    game = SideStacker()
+    model = ResNet(game, 4, 64, torch.device("cpu"))
+    model.load_state_dict(torch.load(options.checkpoint, map_location="cpu"))
+    model.eval()
+
+    output = options.output or options.checkpoint.with_suffix(f".{options.backend}")
+    export(model, output, options.backend)
+    backend = load_backend(options.backend, model, output)
+    policy_error, value_error = compare(backend, model, sample_positions(game), game)
+    print(f"wrote {output}")
+    print(f"max abs error: policy {policy_error:.2e}, value {value_error:.2e}")
+
+
+if __name__ == "__main__":
+    main()
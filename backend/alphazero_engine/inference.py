@@ -0,0 +1,103 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import torch
+
+
+class InferenceServer:
+    """Batches forward passes from concurrent searches into one model call.
+
+    Calls look like calls to the model itself, so an InferenceServer can be
+    handed to MCTS in its place. A worker thread takes the first pending
+    request, then gathers more until max_batch rows, max_wait seconds, or
+    every caller currently waiting is already in the batch. The worker exits
+    after idle seconds without requests and is restarted by the next call,
+    so a server that is no longer referenced can be freed.
+    """
+
+    def __init__(
+        self, model, max_batch: int = 64, max_wait: float = 0.002, idle: float = 30.0
+    ):
+        self.model = model
+        self.device = model.device
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.idle = idle
+        self.requests = queue.Queue()
+        self.waiting = 0
+        self.batches = 0
+        self.rows = 0
+        self.lock = threading.Lock()
+        self.worker = None
+
+    def __call__(self, encoded):
+        future = Future()
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._serve, daemon=True)
+                self.worker.start()
+            self.waiting += 1
+        try:
+            self.requests.put((encoded, future))
+            return future.result()
+        finally:
+            with self.lock:
+                self.waiting -= 1
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "mean_batch": self.rows / self.batches if self.batches else 0.0,
+        }
+
+    def _gather(self):
+        while True:
+            try:
+                batch = [self.requests.get(timeout=self.idle)]
+                break
+            except queue.Empty:
+                # Callers count themselves in before queueing, so nobody can
+                # be left waiting on a worker that has stopped.
+                with self.lock:
+                    if not self.waiting:
+                        self.worker = None
+                        return None
+        rows = len(batch[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_batch and len(batch) < self.waiting:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            rows += len(request[0])
+        return batch
+
+    @torch.no_grad()
+    def _serve(self):
+        while True:
+            batch = self._gather()
+            if batch is None:
+                return
+            try:
+                policies, values = self.model(
+                    torch.cat([encoded for encoded, _ in batch])
+                )
+            except Exception as error:
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+
+            self.batches += 1
+            start = 0
+            for encoded, future in batch:
+                end = start + len(encoded)
+                future.set_result((policies[start:end], values[start:end]))
+                start = end
+            self.rows += start
@@ -1,11 +1,28 @@
 import math
+import time
 import torch
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from threading import Lock
+
+from sidestacker import TranspositionTable
+from .evaluation import EvaluationCache
 
 
 class Node:
     def __init__(
-        self, game, args, state, parent=None, action_taken=None, prior=0, visit_count=0
+        self,
+        game,
+        args,
+        state,
+        parent=None,
+        action_taken=None,
+        prior=0,
+        visit_count=0,
+        table=None,
+        key=None,
+        index=None,
     ):
         self.game = game
         self.args = args
@@ -13,120 +30,359 @@ class Node:
         self.parent = parent
         self.action_taken = action_taken
         self.prior = prior
+        self.table = table
+        self.entry = None if table is None else table.lookup(key)
+        self.index = index
 
+        # Filled in by expand. Children are stored as arrays over the legal
+        # actions; a child Node is only built when selection first picks it.
+        self.actions = None
         self.children = []
+        self.num_moves = 0
+        # Solver status for the player to move here: 1 proven win, -1 proven
+        # loss, 0 unknown.
+        self.proven = 0
 
         self.visit_count = visit_count
         self.value_sum = 0
 
     def is_fully_expanded(self):
-        return len(self.children) > 0
+        return self.actions is not None
 
     def select(self):
-        best_child = None
-        best_ucb = -np.inf
-
-        for child in self.children:
-            ucb = self.get_ucb(child)
-            if ucb > best_ucb:
-                best_child = child
-                best_ucb = ucb
-
-        return best_child
-
-    def get_ucb(self, child):
-        if child.visit_count == 0:
-            q_value = 0
-        else:
-            q_value = 1 - ((child.value_sum / child.visit_count) + 1) / 2
-        return (
+        # Q comes from the child_stat arrays, seeded from the transposition
+        # table when a child is built; U from this node's own edge visits.
+        stat_visits = self.child_stat_visits
+        q_value = np.where(
+            stat_visits > 0,
+            1 - (self.child_stat_values / np.maximum(stat_visits, 1) + 1) / 2,
+            0,
+        )
+        ucb = (
             q_value
             + self.args["C"]
-            * (math.sqrt(self.visit_count) / (child.visit_count + 1))
-            * child.prior
+            * (math.sqrt(self.visit_count) / (self.child_visits + 1))
+            * self.priors
         )
+        # A proven win for the opponent is never worth another visit.
+        ucb[self.child_proven == 1] = -np.inf
+        return self.get_child_at(int(np.argmax(ucb)))
+
+    def is_decided(self, remaining):
+        # True once no child can overtake the most visited one within the
+        # remaining simulations, so the argmax is already final.
+        if self.actions is None:
+            return False
+        visits = np.sort(self.child_visits)
+        runner_up = visits[-2] if len(visits) > 1 else 0
+        return visits[-1] - runner_up > remaining
 
-    def expand(self, policy):
-        child = None
-        for action, prob in enumerate(policy):
-            if prob > 0:
-                child_state = self.state.copy()
-                child_state = self.game.get_next_state(child_state, action, 1)
-                child_state = self.game.change_perspective(child_state, player=-1)
+    def get_child(self, action):
+        # Only returns children that have been built.
+        if self.actions is None:
+            return None
+        indices = np.flatnonzero(self.actions == action)
+        if len(indices) == 0:
+            return None
+        return self.children[indices[0]]
 
-                child = Node(self.game, self.args, child_state, self, action, prob)
-                self.children.append(child)
+    def get_child_at(self, index):
+        child = self.children[index]
+        if child is None:
+            action = int(self.actions[index])
+            child_state = self.state.copy()
+            child_state = self.game.get_next_state(child_state, action, 1)
+            child_state = self.game.change_perspective(child_state, player=-1)
 
+            child = Node(
+                self.game,
+                self.args,
+                child_state,
+                self,
+                action,
+                self.priors[index],
+                table=self.table,
+                key=None if self.keys is None else self.keys[index],
+                index=index,
+            )
+            if child.entry is not None:
+                self.child_stat_visits[index] += child.entry.visit_count
+                self.child_stat_values[index] += child.entry.value_sum
+            self.children[index] = child
         return child
 
-    def backpropagate(self, value):
+    def expand(self, policy, position):
+        self.num_moves = len(position.moves)
+        self.actions = np.flatnonzero(policy > 0)
+        self.priors = policy[self.actions]
+        self.child_visits = np.zeros(len(self.actions))
+        self.child_stat_visits = np.zeros(len(self.actions))
+        self.child_stat_values = np.zeros(len(self.actions))
+        self.child_proven = np.zeros(len(self.actions), dtype=np.int8)
+        self.children = [None] * len(self.actions)
+        self.keys = None
+        if self.table is not None:
+            self.keys = [
+                position.canonical_hash_after(action) for action in self.actions
+            ]
+
+    def update(self, visits, value, shared=True):
+        # shared=False keeps the update out of the transposition table, whose
+        # entries other trees and threads seed new children from.
+        self.visit_count += visits
         self.value_sum += value
-        self.visit_count += 1
+        if shared and self.entry is not None:
+            self.table.add(self.entry, visits, value)
+        if self.parent is not None:
+            index = self.index
+            self.parent.child_visits[index] += visits
+            self.parent.child_stat_visits[index] += visits
+            self.parent.child_stat_values[index] += value
+
+    def backpropagate(self, value):
+        self.update(1, value)
 
         value = self.game.get_opponent_value(value)
         if self.parent is not None:
             self.parent.backpropagate(value)
 
+    def prove(self):
+        # Called on a won terminal node, which the player to move has lost. A
+        # parent is won if any child is lost, and lost once every legal move
+        # has a child and all of them are wins.
+        self.proven = -1
+        node = self
+        while node.parent is not None:
+            node.parent.child_proven[node.index] = node.proven
+            node = node.parent
+            proven = node.child_proven
+            if (proven == -1).any():
+                node.proven = 1
+            elif len(proven) == node.num_moves and (proven == 1).all():
+                node.proven = -1
+            else:
+                break
+
+    def apply_virtual_loss(self, sign=1):
+        # Counts a pending visit as a loss for the player who chose each node
+        # on the path, steering other threads elsewhere. Call again with
+        # sign=-1 before backpropagating the real value. Only this tree sees
+        # it; the transposition table holds backpropagated values alone.
+        node = self
+        while node is not None:
+            node.update(sign, sign, shared=False)
+            node = node.parent
+
 
 class MCTS:
     def __init__(self, game, args, model):
         self.game = game
         self.args = args
         self.model = model
+        self.table = None
+        if args.get("tt_size"):
+            self.table = TranspositionTable(args["tt_size"])
+        self.evaluations = None
+        if args.get("eval_cache_bytes"):
+            self.evaluations = EvaluationCache(args["eval_cache_bytes"])
 
-    @torch.no_grad()
-    def search(self, state):
-        root = Node(self.game, self.args, state, visit_count=1)
-
-        policy, _ = self.model(
-            torch.tensor(
-                self.game.get_encoded_state(state), device=self.model.device
-            ).unsqueeze(0)
+    def new_root(self, state):
+        return Node(
+            self.game,
+            self.args,
+            state,
+            visit_count=1,
+            table=self.table,
+            key=self.game.get_canonical_hash(state),
         )
-        policy = torch.softmax(policy, dim=1).squeeze(0).cpu().numpy()
-        policy = (1 - self.args["dirichlet_epsilon"]) * policy + self.args[
-            "dirichlet_epsilon"
-        ] * np.random.dirichlet([self.args["dirichlet_alpha"]] * self.game.action_size)
 
-        valid_moves = self.game.get_valid_moves(state)
-        policy *= valid_moves
-        policy /= np.sum(policy)
-        root.expand(policy)
+    def search(self, state, root=None, deadline=None, cancel=None):
+        action_probs, searches = self.search_visits(state, root, deadline, cancel)
+        action_probs /= np.sum(action_probs)
+        return action_probs
+
+    @torch.no_grad()
+    def search_visits(self, state, root=None, deadline=None, cancel=None):
+        # Runs until num_searches simulations, the time.monotonic() deadline
+        # or the cancel event, whichever comes first, and returns the root
+        # visit counts with the number of simulations completed.
+        position = self.game.get_position(state)
+        if self.args.get("early_stop"):
+            action = position.forced_move()
+            if action is not None:
+                visits = np.zeros(self.game.action_size)
+                visits[action] = 1
+                return visits, 0
 
-        for search in range(self.args["num_searches"]):
-            node = root
+        if root is None:
+            root = self.new_root(state)
+        stop_at = None
+        if self.args.get("early_stop"):
+            stop_at = root.visit_count + self.args["num_searches"]
 
-            while node is not None and node.is_fully_expanded():
-                node = node.select()
+        if not root.is_fully_expanded():
+            [(policy, _)] = self.evaluate([(state, position)])
+            policy = (1 - self.args["dirichlet_epsilon"]) * policy + self.args[
+                "dirichlet_epsilon"
+            ] * np.random.dirichlet(
+                [self.args["dirichlet_alpha"]] * self.game.action_size
+            )
 
-            if node is None:
-                continue
+            valid_moves = position.get_valid_moves()
+            policy *= valid_moves
+            policy /= np.sum(policy)
+            root.expand(policy, position)
 
-            value, is_terminal = self.game.get_value_and_terminated(
-                node.state, node.action_taken
+        threads = self.args.get("threads", 1)
+        if threads == 1:
+            searches = self.run_simulations(
+                root,
+                position,
+                self.args["num_searches"],
+                nullcontext(),
+                deadline,
+                stop_at,
+                cancel,
             )
-            value = self.game.get_opponent_value(value)
-
-            if not is_terminal:
-                policy, value = self.model(
-                    torch.tensor(
-                        self.game.get_encoded_state(node.state),
-                        device=self.model.device,
-                    ).unsqueeze(0)
+        else:
+            # Tree parallelism: threads share the tree under the lock and run
+            # their forward passes outside it, where torch releases the GIL.
+            lock = Lock()
+            share, extra = divmod(self.args["num_searches"], threads)
+            with ThreadPoolExecutor(threads) as executor:
+                futures = [
+                    executor.submit(
+                        self.run_simulations,
+                        root,
+                        self.game.get_position(state),
+                        share + (thread < extra),
+                        lock,
+                        deadline,
+                        stop_at,
+                        cancel,
+                    )
+                    for thread in range(threads)
+                ]
+                searches = sum(future.result() for future in futures)
+
+        # Keep only proven winning moves if there are any, and drop proven
+        # losing moves unless nothing else is left.
+        visits = np.zeros(self.game.action_size)
+        if root.actions is not None:
+            counts = root.child_visits
+            if root.proven == 1:
+                counts = np.where(root.child_proven == -1, counts, 0)
+            elif root.proven == 0:
+                counts = np.where(root.child_proven == 1, 0, counts)
+            visits[root.actions] = counts
+        return visits, searches
+
+    @torch.no_grad()
+    def evaluate(self, leaves):
+        # Masked, normalized policy and value for each (state, position),
+        # served from the evaluation cache where possible and otherwise from
+        # one batched forward pass.
+        results = [None] * len(leaves)
+        misses = []
+        for index, (state, position) in enumerate(leaves):
+            if self.evaluations is not None:
+                key, symmetry = position.canonical_symmetry
+                cached = self.evaluations.get(key)
+                if cached is not None:
+                    policy, value = cached
+                    results[index] = (
+                        self.game.transform_policy(policy, symmetry),
+                        value,
+                    )
+                    continue
+            misses.append(index)
+
+        if misses:
+            policies, values = self.model(
+                torch.tensor(
+                    self.game.get_encoded_state(
+                        np.stack([leaves[index][0] for index in misses])
+                    ),
+                    device=self.model.device,
                 )
-                policy = torch.softmax(policy, dim=1).squeeze(0).cpu().numpy()
-                valid_moves = self.game.get_valid_moves(node.state)
-                policy *= valid_moves
+            )
+            policies = torch.softmax(policies, dim=1).cpu().numpy()
+            values = values.squeeze(1).cpu().numpy()
+            for index, policy, value in zip(misses, policies, values):
+                position = leaves[index][1]
+                policy *= position.get_valid_moves()
                 policy /= np.sum(policy)
-
                 value = value.item()
+                results[index] = (policy, value)
+                if self.evaluations is not None:
+                    key, symmetry = position.canonical_symmetry
+                    self.evaluations.put(
+                        key, (self.game.transform_policy(policy, symmetry), value)
+                    )
+        return results
+
+    @torch.no_grad()
+    def run_simulations(
+        self, root, position, count, lock, deadline=None, stop_at=None, cancel=None
+    ):
+        batch_size = self.args.get("eval_batch", 1)
+        completed = 0
+        while completed < count:
+            # Up to batch_size leaves, kept apart by virtual loss and
+            # evaluated in a single forward pass.
+            leaves = []
+            with lock:
+                for search in range(min(batch_size, count - completed)):
+                    node = root
 
-                node.expand(policy)
+                    while node.is_fully_expanded() and not node.proven:
+                        node = node.select()
+                        position.play(node.action_taken)
 
-            node.backpropagate(value)
+                    leaf = None
+                    if node.proven:
+                        value = node.proven
+                    else:
+                        value, is_terminal = position.get_value_and_terminated()
+                        if is_terminal and value and self.args.get("solver"):
+                            node.prove()
+                        value = self.game.get_opponent_value(value)
+                        if not is_terminal:
+                            leaf = position.copy()
+                    node.apply_virtual_loss()
+                    leaves.append((node, value, leaf))
 
-        action_probs = np.zeros(self.game.action_size)
-        for child in root.children:
-            action_probs[child.action_taken] = child.visit_count
-        action_probs /= np.sum(action_probs)
-        return action_probs
+                    while position.history:
+                        position.undo()
+
+            evaluations = iter(
+                self.evaluate(
+                    [
+                        (node.state, leaf)
+                        for node, value, leaf in leaves
+                        if leaf is not None
+                    ]
+                )
+            )
+
+            with lock:
+                for node, value, leaf in leaves:
+                    node.apply_virtual_loss(-1)
+                    if leaf is not None:
+                        policy, value = next(evaluations)
+                        # The same leaf may have been picked twice, or
+                        # expanded by another thread meanwhile.
+                        if not node.is_fully_expanded():
+                            node.expand(policy, leaf)
+                    node.backpropagate(value)
+                decided = root.proven or (
+                    stop_at is not None and root.is_decided(stop_at - root.visit_count)
+                )
+            completed += len(leaves)
+
+            # Checked after each batch, so at least one always completes.
+            if decided or deadline is not None and time.monotonic() >= deadline:
+                break
+            if cancel is not None and cancel.is_set():
+                break
+        return completed
@@ -0,0 +1,217 @@
+"""Inference-only variants of the ResNet: BatchNorm folded into the preceding
+convolutions, and post-training static INT8 quantization calibrated on
+self-play positions.
+
+python -m alphazero_engine.quantize model_27.pt prints an accuracy report and
+a latency benchmark against the float checkpoint.
+"""
+
+import argparse
+import copy
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+from sidestacker import SideStacker
+from .ResNet import ResNet
+from .backends import export, load_backend
+
+QUANTIZED_BACKENDS = ("int8", "onnx-int8")
+
+
+def fuse(model):
+    # Folds every BatchNorm2d into the Conv2d before it and drops the
+    # BatchNorm, leaving an eval-only copy of model.
+    fused = copy.deepcopy(model).eval()
+    for sequential in (fused.startBlock, fused.policyHead, fused.valueHead):
+        sequential[0] = fuse_conv_bn_eval(sequential[0], sequential[1])
+        sequential[1] = torch.nn.Identity()
+    for block in fused.backBone:
+        block.conv1 = fuse_conv_bn_eval(block.conv1, block.bn1)
+        block.bn1 = torch.nn.Identity()
+        block.conv2 = fuse_conv_bn_eval(block.conv2, block.bn2)
+        block.bn2 = torch.nn.Identity()
+    return fused
+
+
+@torch.no_grad()
+def selfplay_positions(model, game, count=512, seed=0):
+    # Positions from games the model plays against itself, sampling each
+    # move from its own masked policy.
+    rng = np.random.default_rng(seed)
+    states = []
+    while len(states) < count:
+        position = game.get_position(game.get_initial_state())
+        while len(states) < count and not position.get_value_and_terminated()[1]:
+            state = position.to_board()
+            states.append(state)
+            policy, _ = model(
+                torch.tensor(
+                    game.get_encoded_state(state), device=model.device
+                ).unsqueeze(0)
+            )
+            policy = torch.softmax(policy, dim=1).squeeze(0).cpu().numpy()
+            policy = policy.astype(np.float64) * position.get_valid_moves()
+            position.play(int(rng.choice(game.action_size, p=policy / policy.sum())))
+    return np.stack(states)
+
+
+def select_engine():
+    engine = "x86" if "x86" in torch.backends.quantized.supported_engines else "fbgemm"
+    torch.backends.quantized.engine = engine
+    return engine
+
+
+def quantize(model, calibration, game):
+    """Static INT8 model on torch's x86/fbgemm kernels. prepare_fx fuses the
+    conv, BatchNorm and ReLU patterns itself before inserting observers."""
+    from torch.ao.quantization import get_default_qconfig_mapping
+    from torch.ao.quantization.quantize_fx import convert_fx, prepare_fx
+
+    engine = select_engine()
+    encoded = torch.tensor(game.get_encoded_state(calibration))
+    float_model = copy.deepcopy(model).cpu().eval()
+    prepared = prepare_fx(
+        float_model, get_default_qconfig_mapping(engine), (encoded[:1],)
+    )
+    with torch.no_grad():
+        for start in range(0, len(encoded), 64):
+            prepared(encoded[start : start + 64])
+    return convert_fx(prepared)
+
+
+def save_int8(model, path, calibration, game):
+    """quantize(), frozen to TorchScript at path so the calibration is only
+    run once per checkpoint."""
+    quantized = quantize(model, calibration, game)
+    example = torch.tensor(game.get_encoded_state(calibration[:1]))
+    with torch.no_grad():
+        traced = torch.jit.trace(quantized, example)
+    torch.jit.save(torch.jit.freeze(traced), str(path))
+
+
+def quantize_onnx(model, path, calibration, game):
+    """Static INT8 ONNX graph (QDQ, per-channel weights) at path, for ONNX
+    Runtime. Needs the onnx extra."""
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_static,
+    )
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            encoded = game.get_encoded_state(calibration)
+            self.batches = iter(
+                encoded[index : index + 1] for index in range(len(encoded))
+            )
+
+        def get_next(self):
+            batch = next(self.batches, None)
+            return None if batch is None else {"board": batch}
+
+    path = Path(path)
+    float_path = path.with_suffix(".float.onnx")
+    export(model, float_path, "onnx")
+    quant_pre_process(str(float_path), str(float_path))
+    quantize_static(
+        str(float_path),
+        str(path),
+        Reader(),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+    )
+    float_path.unlink()
+
+
+@torch.no_grad()
+def accuracy(backend, model, states, game):
+    # Policy KL(model || backend) over legal moves, value errors and how often
+    # both pick the same most likely move.
+    encoded = torch.tensor(game.get_encoded_state(states), device=model.device)
+    valid = torch.tensor(game.get_valid_moves_batch(states), dtype=torch.bool)
+    policy, value = backend(encoded)
+    expected_policy, expected_value = model(encoded)
+
+    def log_policy(logits):
+        logits = logits.cpu().float().masked_fill(~valid, -torch.inf)
+        return torch.log_softmax(logits, dim=1)
+
+    log_p = log_policy(expected_policy)
+    log_q = log_policy(policy)
+    terms = torch.where(valid, log_p.exp() * (log_p - log_q), 0)
+    value_error = (value.cpu().float() - expected_value.cpu()).abs()
+    return {
+        "policy_kl": terms.sum(dim=1).mean().item(),
+        "top_move_agreement": (log_p.argmax(1) == log_q.argmax(1))
+        .float()
+        .mean()
+        .item(),
+        "value_mae": value_error.mean().item(),
+        "value_max_error": value_error.max().item(),
+    }
+
+
+def check(backend, model, game, max_kl=0.02, max_value_error=0.05):
+    report = accuracy(
+        backend, model, selfplay_positions(model, game, 256, seed=1), game
+    )
+    if report["policy_kl"] > max_kl or report["value_mae"] > max_value_error:
+        raise ValueError(f"quantized backend is too far from the float model: {report}")
+    return report
+
+
+@torch.no_grad()
+def latency(backend, encoded, repeats=200):
+    for _ in range(20):
+        backend(encoded)
+    start = time.perf_counter()
+    for _ in range(repeats):
+        backend(encoded)
+    return (time.perf_counter() - start) / repeats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("checkpoint", type=Path)
+    options = parser.parse_args()
+
+    game = SideStacker()
+    model = ResNet(game, 4, 64, torch.device("cpu"))
+    model.load_state_dict(torch.load(options.checkpoint, map_location="cpu"))
+    model.eval()
+
+    test = selfplay_positions(model, game, 512, seed=1)
+    candidates = {"eager": model}
+    for name in ("fused", "int8", "onnx", "onnx-int8"):
+        path = options.checkpoint.with_suffix(f".{name}")
+        try:
+            candidates[name] = load_backend(name, model, path)
+        except ImportError as error:
+            print(f"skipping {name}: {error}")
+
+    print(
+        f"{'backend':<10} {'policy KL':>10} {'top move':>9} {'value MAE':>10}"
+        f" {'value max':>10} {'batch 1 ms':>11} {'batch 8 ms':>11}"
+    )
+    for name, backend in candidates.items():
+        report = accuracy(backend, model, test, game)
+        single = latency(backend, torch.tensor(game.get_encoded_state(test[:1])))
+        batch = latency(backend, torch.tensor(game.get_encoded_state(test[:8])))
+        print(
+            f"{name:<10} {report['policy_kl']:>10.5f}"
+            f" {report['top_move_agreement']:>9.1%} {report['value_mae']:>10.4f}"
+            f" {report['value_max_error']:>10.4f} {single * 1e3:>11.3f}"
+            f" {batch * 1e3:>11.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
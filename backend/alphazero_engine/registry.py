@@ -0,0 +1,100 @@
+import re
+import threading
+from pathlib import Path
+
+CHECKPOINT = re.compile(r"model_(\d+)")
+
+
+class Checkpoint:
+    """A loaded checkpoint with the backend, inference server and MCTS built
+    on its weights. Searches hold on to the Checkpoint they started with, so
+    swapping a level's checkpoint never disturbs one in flight."""
+
+    def __init__(self, name, model, backend, inference, mcts, startup):
+        self.name = name
+        self.model = model
+        self.backend = backend
+        self.inference = inference
+        self.mcts = mcts
+        self.startup = startup
+
+
+class ModelRegistry:
+    """Checkpoints in directory, served per difficulty level.
+
+    Checkpoints are named model_<version> after their files and can be asked
+    for by name or version. Each is loaded at most once, by load(name, path),
+    and shared by every level assigned to it; one no level uses any more is
+    dropped and freed once its last search finishes.
+    """
+
+    def __init__(self, directory, load, levels):
+        self.directory = Path(directory)
+        self.load_checkpoint = load
+        self.levels = dict(levels)
+        self.loaded = {}
+        self.lock = threading.Lock()
+        # Loads run one at a time, so concurrent first requests for a level
+        # wait for a single load rather than each starting their own.
+        self.loading = threading.Lock()
+
+    def available(self):
+        versions = [
+            int(match[1])
+            for path in self.directory.glob("model_*.pt")
+            if (match := CHECKPOINT.fullmatch(path.stem))
+        ]
+        return [f"model_{version}" for version in sorted(versions)]
+
+    def resolve(self, name) -> str:
+        name = str(name).removesuffix(".pt")
+        if name.isdigit():
+            name = f"model_{int(name)}"
+        available = self.available()
+        if name not in available:
+            raise ValueError(
+                f"unknown checkpoint {name!r}, expected one of {available}"
+            )
+        return name
+
+    def load(self, name) -> Checkpoint:
+        name = self.resolve(name)
+        with self.loading:
+            with self.lock:
+                checkpoint = self.loaded.get(name)
+            if checkpoint is None:
+                checkpoint = self.load_checkpoint(name, self.directory / f"{name}.pt")
+                with self.lock:
+                    self.loaded[name] = checkpoint
+        return checkpoint
+
+    def get(self, level) -> Checkpoint:
+        # Raises KeyError for a level that has no checkpoint assigned.
+        with self.lock:
+            name = self.levels[level]
+            checkpoint = self.loaded.get(name)
+        if checkpoint is None:
+            checkpoint = self.load(name)
+            with self.lock:
+                # Levels may be configured by version; store the full name.
+                if self.levels.get(level) == name:
+                    self.levels[level] = checkpoint.name
+        return checkpoint
+
+    def assign(self, level, name) -> Checkpoint:
+        # The new checkpoint is loaded and warmed up while the old one keeps
+        # serving; the switch itself is a single dict update.
+        checkpoint = self.load(name)
+        with self.lock:
+            self.levels[level] = checkpoint.name
+            in_use = set(self.levels.values())
+            for loaded_name in list(self.loaded):
+                if loaded_name not in in_use:
+                    del self.loaded[loaded_name]
+        return checkpoint
+
+    def status(self):
+        with self.lock:
+            levels = dict(self.levels)
+            loaded = sorted(self.loaded)
+        return {"levels": levels, "loaded": loaded, "available": self.available()}
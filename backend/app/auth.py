@@ -1,13 +1,20 @@
 from datetime import datetime, timedelta
 from typing import Annotated
 import logging
+import secrets
 import time
 
-from fastapi import Depends, Request
+from fastapi import Depends, HTTPException, Request
 from fastapi.security.utils import get_authorization_scheme_param
 import jwt
 
-from app.constants import COOKIE_NAME, COOKIE_EXPIRY, TOKEN_ALGORITHM, TOKEN_SECRET
+from app.constants import (
+    COOKIE_NAME,
+    COOKIE_EXPIRY,
+    MODEL_ADMIN_TOKEN,
+    TOKEN_ALGORITHM,
+    TOKEN_SECRET,
+)
 from app.models import User, UserDict
 from utils import generateFruitname
 
@@ -39,6 +46,18 @@ def get_current_user(request: Request) -> User | None:
 CurrentUser = Annotated[User, Depends(get_current_user)]
 
 
+def require_admin(request: Request):
+    scheme, token = get_authorization_scheme_param(
+        request.headers.get("Authorization", "")
+    )
+    if not (
+        MODEL_ADMIN_TOKEN
+        and scheme.lower() == "bearer"
+        and secrets.compare_digest(token.encode(), MODEL_ADMIN_TOKEN.encode())
+    ):
+        raise HTTPException(status_code=404, detail="Item not found")
+
+
 def create_jwt(user: User):
     expiration = datetime.now() + timedelta(hours=24)
     token = jwt.encode(
@@ -18,3 +18,21 @@ TOKEN_SECRET = os.getenv("TOKEN_SECRET", base64_secret)
 TOKEN_ALGORITHM = "HS256"
 
 BOARD_SIZE = 7
+
+# Per-move search time in seconds: /mcts backs "medium", /alphazero "hard".
+MCTS_TIME_LIMIT = float(os.getenv("MCTS_TIME_LIMIT", "1.0"))
+ALPHAZERO_TIME_LIMIT = float(os.getenv("ALPHAZERO_TIME_LIMIT", "2.0"))
+# Shortest search a client may ask for; the engines still run at least one
+# simulation past their deadline.
+MIN_TIME_LIMIT = 0.01
+
+# Searches run in the engine service (engine_worker), reached over a Unix
+# socket, or in this process with ENGINE_TRANSPORT=local. Unless ENGINE_SPAWN=0,
+# the app spawns the service itself when none answers on the socket yet.
+ENGINE_TRANSPORT = os.getenv("ENGINE_TRANSPORT", "unix")
+ENGINE_SOCKET = os.getenv("ENGINE_SOCKET", "engine.sock")
+ENGINE_SPAWN = os.getenv("ENGINE_SPAWN", "1") == "1"
+
+# Bearer token for the /models endpoints that swap AlphaZero checkpoints;
+# they are disabled while unset.
+MODEL_ADMIN_TOKEN = os.getenv("MODEL_ADMIN_TOKEN", "")
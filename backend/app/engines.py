@@ -0,0 +1,91 @@
+import asyncio
+import contextlib
+import sys
+import time
+
+from fastapi import HTTPException, Request
+
+from app.constants import ENGINE_SOCKET, ENGINE_TRANSPORT
+from engine_worker import LocalTransport, UnixSocketTransport
+
+# How often a waiting request checks whether its client has gone away.
+DISCONNECT_POLL = 0.1
+# How long past its deadline a search may take to come back, e.g. the first
+# one on a checkpoint that is still loading, before the request gives up.
+DEADLINE_GRACE = 5.0
+# How long a spawned engine service gets to save its caches and exit.
+STOP_TIMEOUT = 10.0
+
+STATUS_CODES = {
+    "busy": 503,
+    "expired": 504,
+    "not_found": 404,
+    "invalid": 422,
+    "error": 500,
+}
+
+if ENGINE_TRANSPORT == "local":
+    transport = LocalTransport()
+else:
+    transport = UnixSocketTransport(ENGINE_SOCKET)
+
+
+async def spawn_engine():
+    # Only spawns a service when none answers yet, e.g. one started by
+    # another worker of this app. The service also refuses to take over a
+    # socket that another one is serving.
+    if await transport.ping():
+        return None
+    return await asyncio.create_subprocess_exec(
+        sys.executable, "-m", "engine_worker", "--socket", ENGINE_SOCKET
+    )
+
+
+async def stop_engine(process):
+    try:
+        process.terminate()
+    except ProcessLookupError:
+        pass
+    try:
+        await asyncio.wait_for(process.wait(), STOP_TIMEOUT)
+    except TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+async def send(message: dict, request: Request | None = None, expires_at=None):
+    # Sends a message to the engine service and waits for the reply,
+    # withdrawing it if the client disconnects or the deadline is long gone.
+    reply = asyncio.create_task(transport.request(message))
+    try:
+        while True:
+            done, _ = await asyncio.wait({reply}, timeout=DISCONNECT_POLL)
+            if done:
+                break
+            if request is not None and await request.is_disconnected():
+                raise HTTPException(status_code=499, detail="Client disconnected")
+            if expires_at is not None and time.time() > expires_at + DEADLINE_GRACE:
+                raise HTTPException(status_code=504, detail="Engine timed out")
+        result = reply.result()
+    except OSError as error:
+        raise HTTPException(
+            status_code=503, detail="Engine unavailable", headers={"Retry-After": "1"}
+        ) from error
+    finally:
+        # Also reached when this request is itself cancelled, so the reply
+        # task never outlives it.
+        if not reply.done():
+            reply.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await reply
+
+    status = result["status"]
+    if status == "ok":
+        return result
+    if status == "not_found":
+        raise HTTPException(status_code=404, detail="Item not found")
+    raise HTTPException(
+        status_code=STATUS_CODES.get(status, 500),
+        detail=result.get("detail", status),
+        headers={"Retry-After": "1"} if status == "busy" else None,
+    )
@@ -1,7 +1,7 @@
 from contextlib import asynccontextmanager
 from typing import Annotated
 
-from game_engine import alphazero_engine, mcts_engine
+from engine_worker import Job
 
 from fastapi import (
     Depends,
@@ -21,8 +21,23 @@ from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from sqlmodel import Session
 
-from app.auth import CurrentUser, create_user, create_jwt, decode_token
-from app.constants import ROOT_PATH, COOKIE_NAME, COOKIE_EXPIRY
+from app.auth import (
+    CurrentUser,
+    create_user,
+    create_jwt,
+    decode_token,
+    require_admin,
+)
+from app.constants import (
+    ROOT_PATH,
+    COOKIE_NAME,
+    COOKIE_EXPIRY,
+    MCTS_TIME_LIMIT,
+    ALPHAZERO_TIME_LIMIT,
+    MIN_TIME_LIMIT,
+    ENGINE_TRANSPORT,
+    ENGINE_SPAWN,
+)
 from app.db import (
     add_game,
     add_multiplayer,
@@ -33,6 +48,7 @@ from app.db import (
     init_db,
     update_game,
 )
+from app.engines import send, spawn_engine, stop_engine, transport
 from app.game import create_game, create_multiplayer_game
 from app.models import User, UserDict, Game, Move, GameState, GameResponse
 
@@ -51,10 +67,14 @@ async def lifespan(app: FastAPI):
     process = None
     try:
         init_db()
+        if ENGINE_TRANSPORT == "unix" and ENGINE_SPAWN:
+            process = await spawn_engine()
+        await transport.start()
         yield
     finally:
+        await transport.close()
         if process:
-            process.terminate()
+            await stop_engine(process)
 
 
 app = FastAPI(root_path=ROOT_PATH, lifespan=lifespan)
@@ -111,28 +131,80 @@ async def create_move(
         return updated_game
 
 
+def get_job(engine: str, gameState: GameState, time_limit: float, game_id, level):
+    # Clients may ask for a shorter search, never a longer one.
+    if gameState.time_limit is not None:
+        time_limit = min(max(gameState.time_limit, MIN_TIME_LIMIT), time_limit)
+    return Job.with_budget(
+        engine,
+        gameState.board,
+        gameState.player_symbol,
+        time_limit,
+        game_id=game_id,
+        level=level,
+    )
+
+
+async def search(request: Request, job: Job, response: Response):
+    result = await send({"op": "search", "job": job.to_dict()}, request, job.expires_at)
+    response.headers["X-Searches"] = str(result["searches"])
+    response.headers["X-Cache"] = "hit" if result["cached"] else "miss"
+    return result["move"]
+
+
 @app.post("/mcts")
 async def mcts(
+    request: Request,
     gameState: GameState,
     user: CurrentUser,
+    response: Response,
     session: Session = Depends(get_session),
 ):
     if user is None:
         raise HTTPException(status_code=404, detail="Item not found")
-    action = mcts_engine(gameState.board, gameState.player_symbol)
-    return action
+    db_user = session.get(User, user.id)
+    game_id = db_user.game_id if db_user else None
+    job = get_job("mcts", gameState, MCTS_TIME_LIMIT, game_id, "medium")
+    return await search(request, job, response)
 
 
 @app.post("/alphazero")
 async def alphazero(
+    request: Request,
     gameState: GameState,
     user: CurrentUser,
+    response: Response,
     session: Session = Depends(get_session),
 ):
     if user is None:
         raise HTTPException(status_code=404, detail="Item not found")
-    action = alphazero_engine(gameState.board, gameState.player_symbol)
-    return action
+    db_user = session.get(User, user.id)
+    game_id = db_user.game_id if db_user else None
+    job = get_job(
+        "alphazero", gameState, ALPHAZERO_TIME_LIMIT, game_id, gameState.level
+    )
+    return await search(request, job, response)
+
+
+class ModelAssignment(BaseModel):
+    checkpoint: str
+
+
+@app.get("/models", dependencies=[Depends(require_admin)])
+async def get_models():
+    result = await send({"op": "models"})
+    return result["models"]
+
+
+@app.put("/models/{level}", dependencies=[Depends(require_admin)])
+async def assign_model(level: str, assignment: ModelAssignment):
+    # The engine service loads and warms up the checkpoint while the old one
+    # keeps serving; searches already running finish on the one they started
+    # with.
+    result = await send(
+        {"op": "assign", "level": level, "checkpoint": assignment.checkpoint}
+    )
+    return result["models"]
 
 
 class Reset(BaseModel):
@@ -51,6 +51,8 @@ class Move(BaseModel):
 class GameState(BaseModel):
     board: list[list[str | None]]
     player_symbol: str
+    time_limit: float | None = None
+    level: str = "hard"
 
 
 class GameResponse(BaseModel):
@@ -0,0 +1,54 @@
+"""Simulations per second for concurrent AlphaZero searches, each calling the
+model directly against all sharing one InferenceServer.
+
+Run from backend/: python -m benchmarks.inference
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from alphazero_engine.engine import args, registry
+from alphazero_engine.inference import InferenceServer
+from alphazero_engine.mcts import MCTS
+from sidestacker import SideStacker
+
+CONCURRENCY = (1, 2, 4, 8)
+NUM_SEARCHES = 200
+
+
+def rate(evaluator, concurrency):
+    game = SideStacker()
+    state = game.get_initial_state()
+    engines = [
+        MCTS(
+            game,
+            {**args, "num_searches": NUM_SEARCHES, "eval_cache_bytes": 0},
+            evaluator,
+        )
+        for _ in range(concurrency)
+    ]
+    with ThreadPoolExecutor(concurrency) as executor:
+        start = time.perf_counter()
+        futures = [executor.submit(mcts.search_visits, state) for mcts in engines]
+        # Early stopping can end a search short of NUM_SEARCHES, so only the
+        # simulations that actually ran count.
+        searches = sum(future.result()[1] for future in futures)
+        return searches / (time.perf_counter() - start)
+
+
+def main():
+    model = registry.get("hard").model
+    server = InferenceServer(model, args["inference_batch"], args["inference_wait"])
+    rate(server, 1)
+    print(f"{'searches':>8} {'direct sims/s':>14} {'server sims/s':>14} {'batch':>6}")
+    for concurrency in CONCURRENCY:
+        server.batches = server.rows = 0
+        served = rate(server, concurrency)
+        print(
+            f"{concurrency:>8} {rate(model, concurrency):>14.0f} {served:>14.0f}"
+            f" {server.stats()['mean_batch']:>6.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""Simulations per second against thread count for both engines.
+
+Run from backend/: python -m benchmarks.threads
+"""
+
+import sys
+import time
+
+from alphazero_engine.engine import args as alphazero_args, registry
+from alphazero_engine.mcts import MCTS as AlphaZeroMCTS
+from mcts_engine.engine import args as mcts_args
+from mcts_engine.mcts import MCTS
+from sidestacker import SideStacker
+
+THREADS = (1, 2, 4, 8)
+
+
+def rate(mcts, state):
+    # Counts the simulations that actually ran, which early stopping can cut
+    # short of num_searches.
+    mcts.search(state)
+    start = time.perf_counter()
+    _, searches = mcts.search_visits(state)
+    return searches / (time.perf_counter() - start)
+
+
+def main():
+    model = registry.get("hard").model
+    game = SideStacker()
+    state = game.get_initial_state()
+    gil = sys._is_gil_enabled() if hasattr(sys, "_is_gil_enabled") else True
+    print(f"python {sys.version.split()[0]}, GIL {'on' if gil else 'off'}")
+    print(f"{'threads':>7} {'mcts sims/s':>12} {'alphazero sims/s':>17}")
+    for threads in THREADS:
+        mcts = MCTS(game, {**mcts_args, "threads": threads})
+        alphazero = AlphaZeroMCTS(
+            game, {**alphazero_args, "num_searches": 200, "threads": threads}, model
+        )
+        print(
+            f"{threads:>7} {rate(mcts, state):>12.0f}"
+            f" {rate(alphazero, state):>17.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
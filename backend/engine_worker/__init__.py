@@ -0,0 +1,4 @@
+from .jobs import Job
+from .transport import LocalTransport, Transport, UnixSocketTransport
+
+__all__ = ["Job", "LocalTransport", "Transport", "UnixSocketTransport"]
@@ -0,0 +1,50 @@
+"""Serves search jobs from the web app over a Unix socket.
+
+The app spawns one of these itself unless ENGINE_SPAWN=0, in which case run
+it separately, e.g. in a container of its own sharing the socket:
+
+Run from backend/: python -m engine_worker --socket engine.sock
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+
+from .service import EngineService
+from .transport import SocketInUse, serve_unix
+
+log = logging.getLogger("uvicorn")
+
+
+async def serve(path):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+    service = EngineService()
+    try:
+        async with serve_unix(service, path):
+            # Connections made while the engines load wait for their reply.
+            service.start()
+            log.info("engine service listening on %s", path)
+            try:
+                await stop.wait()
+            finally:
+                service.shutdown()
+    except SocketInUse as error:
+        # Another app process got its engine up first; the app uses that one.
+        log.info("%s", error)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--socket", default=os.getenv("ENGINE_SOCKET", "engine.sock"))
+    options = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(serve(options.socket))
+
+
+if __name__ == "__main__":
+    main()
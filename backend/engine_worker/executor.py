@@ -0,0 +1,124 @@
+import asyncio
+import heapq
+import itertools
+import math
+import threading
+import time
+
+
+class EngineBusy(Exception):
+    pass
+
+
+class JobExpired(Exception):
+    pass
+
+
+class EngineExecutor:
+    """Runs engine searches on a bounded pool, off the event loop.
+
+    At most workers searches run at once and the rest wait their turn,
+    lowest priority first and then earliest deadline. Past workers +
+    max_queue pending searches run() raises EngineBusy instead of piling up
+    work, and a search whose time.monotonic() deadline passes while it waits
+    raises JobExpired. Cancelling the awaiting task withdraws a waiting
+    search, and tells a running one to stop through the cancel event passed
+    to fn when cancellable is set.
+    """
+
+    def __init__(self, make_executor, workers: int, max_queue: int, cancellable=False):
+        self.make_executor = make_executor
+        self.workers = workers
+        self.max_pending = workers + max_queue
+        self.cancellable = cancellable
+        self.executor = None
+        self.running = 0
+        self.waiting = []
+        self.order = itertools.count()
+
+    @property
+    def pending(self):
+        return self.running + len(self.waiting)
+
+    def start(self):
+        if self.executor is None:
+            self.executor = self.make_executor(self.workers)
+            # Starts every worker now rather than on the first request.
+            for future in [self.executor.submit(int) for _ in range(self.workers)]:
+                future.result()
+        return self
+
+    def shutdown(self):
+        for *_, turn in self.waiting:
+            turn.cancel()
+        self.waiting.clear()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "waiting": len(self.waiting),
+            "max_pending": self.max_pending,
+        }
+
+    async def run(self, fn, *args, priority=0, deadline=None):
+        self.start()
+        if self.pending >= self.max_pending:
+            raise EngineBusy()
+        loop = asyncio.get_running_loop()
+        waited = False
+        if self.running < self.workers:
+            self.running += 1
+        else:
+            waited = True
+            turn = loop.create_future()
+            entry = (priority, math.inf if deadline is None else deadline)
+            entry += (next(self.order), turn)
+            heapq.heappush(self.waiting, entry)
+            try:
+                await turn
+            except asyncio.CancelledError:
+                if turn.cancelled():
+                    # shutdown() empties the queue before cancelling turns.
+                    if entry in self.waiting:
+                        self.waiting.remove(entry)
+                        heapq.heapify(self.waiting)
+                else:
+                    # Cancelled just after being handed a worker.
+                    self._release()
+                raise
+
+        cancel = threading.Event() if self.cancellable else None
+        try:
+            # Only a search that sat in the queue past its deadline expires;
+            # one that got a worker straight away always runs, if only for
+            # the single simulation the engines guarantee.
+            if waited and deadline is not None and time.monotonic() >= deadline:
+                raise JobExpired()
+            if cancel is None:
+                future = self.executor.submit(fn, *args)
+            else:
+                future = self.executor.submit(fn, *args, cancel=cancel)
+        except BaseException:
+            self._release()
+            raise
+        # The worker is only handed on once the search has really stopped,
+        # which for a cancelled one may be a little after the task gives up.
+        future.add_done_callback(lambda _: loop.call_soon_threadsafe(self._release))
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            if cancel is not None:
+                cancel.set()
+            raise
+
+    def _release(self):
+        self.running -= 1
+        while self.waiting:
+            *_, turn = heapq.heappop(self.waiting)
+            if not turn.done():
+                self.running += 1
+                turn.set_result(None)
+                return
@@ -0,0 +1,54 @@
+import time
+
+ENGINES = ("mcts", "alphazero")
+
+
+class Job:
+    """A search for the engine service: the position, the engine and level to
+    search it with, and the budget in seconds along with the time.time()
+    deadline it works out to, which unlike time.monotonic() means the same on
+    every machine."""
+
+    def __init__(
+        self,
+        engine,
+        board,
+        player_symbol,
+        expires_at,
+        game_id=None,
+        level="hard",
+        budget=None,
+    ):
+        if engine not in ENGINES:
+            raise ValueError(f"unknown engine {engine!r}, expected one of {ENGINES}")
+        self.engine = engine
+        self.board = board
+        self.player_symbol = player_symbol
+        self.expires_at = expires_at
+        self.game_id = game_id
+        self.level = level
+        self.budget = budget
+
+    @classmethod
+    def with_budget(cls, engine, board, player_symbol, seconds, **kwargs):
+        expires_at = time.time() + seconds
+        return cls(engine, board, player_symbol, expires_at, budget=seconds, **kwargs)
+
+    @classmethod
+    def from_dict(cls, job: dict):
+        return cls(**job)
+
+    def to_dict(self):
+        return {
+            "engine": self.engine,
+            "board": self.board,
+            "player_symbol": self.player_symbol,
+            "expires_at": self.expires_at,
+            "game_id": self.game_id,
+            "level": self.level,
+            "budget": self.budget,
+        }
+
+    def deadline(self):
+        # The engines time their searches with time.monotonic().
+        return time.monotonic() + (self.expires_at - time.time())
@@ -0,0 +1,68 @@
+import json
+import os
+import time
+
+import numpy as np
+
+from utils import LRUCache
+
+
+class ResultCache(LRUCache):
+    """Root visit counts of finished searches, keyed by canonical position,
+    engine, checkpoint and budget.
+
+    Visits are stored in the canonical orientation, so every mirror image of
+    a position shares one entry; callers map them back with the symmetry
+    from Position.canonical_symmetry and take the most visited move. With a
+    path the cache is saved there on shutdown and loaded again on start.
+    """
+
+    def __init__(self, maxsize: int, ttl: float | None = None, path=None):
+        super().__init__(maxsize, ttl)
+        self.path = path
+
+    @staticmethod
+    def key(position_key: int, engine: str, model: str, budget: float) -> str:
+        return f"{engine}:{model}:{budget:g}:{position_key:x}"
+
+    def put(self, key, value):
+        visits, searches = value
+        visits = np.asarray(visits, dtype=np.int32)
+        visits.flags.writeable = False
+        super().put(key, (visits, searches))
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path) as file:
+            saved = json.load(file)
+        # Ages are kept against time.time(), since the time.monotonic()
+        # stamps of the process that saved them mean nothing here.
+        elapsed = time.time() - saved["saved_at"]
+        now = time.monotonic()
+        with self.lock:
+            for key, age, visits, searches in saved["entries"]:
+                age += elapsed
+                if self.ttl is not None and age > self.ttl:
+                    continue
+                visits = np.asarray(visits, dtype=np.int32)
+                visits.flags.writeable = False
+                self.entries[key] = (now - age, (visits, searches))
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def save(self):
+        if not self.path:
+            return
+        now = time.monotonic()
+        with self.lock:
+            entries = [
+                [key, now - stamp, visits.tolist(), searches]
+                for key, (stamp, (visits, searches)) in self.entries.items()
+            ]
+        # Written to a temporary file first so a crash never leaves half a
+        # cache behind.
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as file:
+            json.dump({"saved_at": time.time(), "entries": entries}, file)
+        os.replace(temporary, self.path)
@@ -0,0 +1,200 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from alphazero_engine import alphazero_engine, load_engine, registry
+from mcts_engine import mcts_engine, start_workers
+from mcts_engine.engine import convert_board
+from sidestacker import SideStacker
+from sidestacker.constants import SIZE
+from .executor import EngineBusy, EngineExecutor, JobExpired
+from .jobs import Job
+from .results import ResultCache
+
+log = logging.getLogger("uvicorn")
+
+sideStacker = SideStacker()
+
+# Pure MCTS runs in a pool of processes, each with its own trees and
+# transposition table; AlphaZero in threads that share the model's inference
+# server. Searches past workers + queue are turned away as busy.
+MCTS_PROCESSES = int(os.getenv("MCTS_PROCESSES", "1"))
+MCTS_QUEUE = int(os.getenv("MCTS_QUEUE", "8"))
+ALPHAZERO_THREADS = int(os.getenv("ALPHAZERO_THREADS", "4"))
+ALPHAZERO_QUEUE = int(os.getenv("ALPHAZERO_QUEUE", "16"))
+
+# Queued searches run lowest priority first, then earliest deadline; levels
+# not listed go last.
+PRIORITIES = {
+    level: int(priority)
+    for level, priority in (
+        entry.split("=", 1)
+        for entry in os.getenv("ENGINE_PRIORITIES", "hard=0,medium=1").split(",")
+    )
+}
+
+# Finished searches are remembered per canonical position, engine, checkpoint
+# and budget for RESULT_CACHE_TTL seconds, and kept in RESULT_CACHE_PATH across
+# restarts when it is set.
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "10000"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "86400"))
+RESULT_CACHE_PATH = os.getenv("RESULT_CACHE_PATH", "")
+
+
+def mcts_processes(workers: int):
+    # Spawned for the same reason as the root-parallel pool: this process
+    # runs threads that fork would copy mid-use.
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=start_workers,
+    )
+
+
+class EngineService:
+    """Answers messages from the web app: search jobs, and the model
+    registry's status and checkpoint assignments."""
+
+    def __init__(self):
+        self.pools = {
+            "mcts": EngineExecutor(mcts_processes, MCTS_PROCESSES, MCTS_QUEUE),
+            "alphazero": EngineExecutor(
+                ThreadPoolExecutor, ALPHAZERO_THREADS, ALPHAZERO_QUEUE, True
+            ),
+        }
+        self.results = ResultCache(
+            RESULT_CACHE_SIZE, RESULT_CACHE_TTL, RESULT_CACHE_PATH or None
+        )
+        # Searches in flight by result cache key, with how many jobs wait on
+        # each.
+        self.inflight = {}
+
+    def start(self):
+        self.results.load()
+        for pool in self.pools.values():
+            pool.start()
+        load_engine()
+        return self
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown()
+        self.results.save()
+
+    def stats(self):
+        stats = {engine: pool.stats() for engine, pool in self.pools.items()}
+        stats["results"] = self.results.stats()
+        return stats
+
+    async def handle(self, message: dict) -> dict:
+        op = message.get("op")
+        if op == "search":
+            try:
+                job = Job.from_dict(message["job"])
+            except (KeyError, TypeError, ValueError) as error:
+                return {"status": "invalid", "detail": str(error)}
+            return await self.search(job)
+        if op == "ping":
+            return {"status": "ok", "pools": self.stats()}
+        if op == "models":
+            return {"status": "ok", "models": registry.status()}
+        if op == "assign":
+            try:
+                await asyncio.to_thread(
+                    registry.assign, message["level"], message["checkpoint"]
+                )
+            except (KeyError, ValueError) as error:
+                return {"status": "invalid", "detail": str(error)}
+            return {"status": "ok", "models": registry.status()}
+        return {"status": "invalid", "detail": f"unknown op {op!r}"}
+
+    async def search(self, job: Job) -> dict:
+        if job.engine == "alphazero":
+            if job.level not in registry.levels:
+                return {"status": "not_found"}
+            model = registry.levels[job.level]
+        else:
+            model = job.engine
+
+        state = convert_board(job.board, job.player_symbol)
+        state = sideStacker.change_perspective(state, -1)
+        position_key, symmetry = sideStacker.get_position(state).canonical_symmetry
+        key = None
+        if job.budget is not None:
+            key = ResultCache.key(position_key, job.engine, model, job.budget)
+
+        cached = self.results.get(key) if key is not None else None
+        if cached is not None:
+            visits, _ = cached
+            result = {"status": "ok", "visits": visits, "searches": 0, "cached": True}
+        elif key is None or job.game_id is not None:
+            # A game's search also leaves a tree for its next move in the
+            # worker that ran it, so it is never folded into another game's.
+            result = await self.run(job, key, symmetry)
+        else:
+            result = await self.shared(key, lambda: self.run(job, key, symmetry))
+        if result["status"] != "ok":
+            return result
+
+        # Visits come back in the canonical orientation.
+        visits = sideStacker.transform_policy(result["visits"], symmetry)
+        return {
+            "status": "ok",
+            "move": list(divmod(int(np.argmax(visits)), SIZE)),
+            "searches": result["searches"],
+            "cached": result.get("cached", False),
+        }
+
+    async def shared(self, key, search):
+        # Identical jobs in flight share one search, which is only withdrawn
+        # once every job waiting on it has been. A withdrawn search leaves
+        # inflight at once, so later jobs start a fresh one rather than join it.
+        entry = self.inflight.get(key)
+        if entry is None:
+            entry = self.inflight[key] = [asyncio.create_task(search()), 0]
+            entry[0].add_done_callback(lambda _: self.forget(key, entry))
+        entry[1] += 1
+        try:
+            return await asyncio.shield(entry[0])
+        except asyncio.CancelledError:
+            entry[1] -= 1
+            if not entry[1]:
+                self.forget(key, entry)
+                entry[0].cancel()
+            raise
+
+    def forget(self, key, entry):
+        if self.inflight.get(key) is entry:
+            del self.inflight[key]
+
+    async def run(self, job: Job, key, symmetry) -> dict:
+        deadline = job.deadline()
+        args = (job.board, job.player_symbol, job.game_id, deadline)
+        if job.engine == "alphazero":
+            engine, args = alphazero_engine, args + (job.level,)
+        else:
+            engine = mcts_engine
+
+        try:
+            _, searches, visits = await self.pools[job.engine].run(
+                engine,
+                *args,
+                priority=PRIORITIES.get(job.level, len(PRIORITIES)),
+                deadline=deadline,
+            )
+        except EngineBusy:
+            return {"status": "busy"}
+        except JobExpired:
+            return {"status": "expired"}
+        except Exception as error:
+            log.exception("%s search failed", job.engine)
+            return {"status": "error", "detail": str(error)}
+
+        visits = sideStacker.transform_policy(np.asarray(visits), symmetry)
+        if key is not None:
+            self.results.put(key, (visits, searches))
+        return {"status": "ok", "visits": visits, "searches": searches}
@@ -0,0 +1,141 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+
+log = logging.getLogger("uvicorn")
+
+
+class SocketInUse(Exception):
+    pass
+
+
+class Transport:
+    """How the web app reaches the engine service.
+
+    request() sends one message and returns the service's reply; cancelling
+    the awaiting task withdraws the message, stopping its search.
+    """
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def request(self, message: dict) -> dict:
+        raise NotImplementedError
+
+
+class LocalTransport(Transport):
+    """Runs the engine service inside the web app's own process."""
+
+    def __init__(self, service=None):
+        self.service = service
+
+    async def start(self):
+        if self.service is None:
+            # Imported here so the engines only load where they are used.
+            from .service import EngineService
+
+            self.service = EngineService()
+        await asyncio.to_thread(self.service.start)
+
+    async def close(self):
+        self.service.shutdown()
+
+    async def request(self, message: dict) -> dict:
+        return await self.service.handle(message)
+
+
+class UnixSocketTransport(Transport):
+    """One connection per message, carrying a line of JSON each way. Closing
+    the connection before the reply withdraws the message."""
+
+    def __init__(self, path, ready_timeout: float = 60.0):
+        self.path = path
+        self.ready_timeout = ready_timeout
+
+    async def start(self):
+        # Waits for the service to come up, e.g. one the app has just spawned.
+        # Requests answer 503 for as long as it stays unreachable.
+        try:
+            async with asyncio.timeout(self.ready_timeout):
+                while not await self.ping():
+                    await asyncio.sleep(0.1)
+        except TimeoutError:
+            log.warning("engine service not reachable at %s", self.path)
+
+    async def ping(self) -> bool:
+        try:
+            await self.request({"op": "ping"})
+        except OSError:
+            return False
+        return True
+
+    async def request(self, message: dict) -> dict:
+        reader, writer = await asyncio.open_unix_connection(self.path)
+        try:
+            writer.write(json.dumps(message).encode() + b"\n")
+            await writer.drain()
+            line = await reader.readline()
+        finally:
+            writer.close()
+        if not line:
+            raise ConnectionError("engine service closed the connection")
+        return json.loads(line)
+
+
+@asynccontextmanager
+async def serve_unix(service, path):
+    """Serves service on a Unix socket at path for the duration of the
+    block.
+
+    An exclusive lock on path.lock makes one service the owner of path, so a
+    second one raises SocketInUse instead of replacing the socket, and the
+    owner only removes the socket it created.
+    """
+
+    async def handle(reader, writer):
+        try:
+            message = json.loads(await reader.readline())
+        except ValueError:
+            writer.close()
+            return
+
+        reply = asyncio.create_task(service.handle(message))
+        closed = asyncio.create_task(reader.read())
+        await asyncio.wait({reply, closed}, return_when=asyncio.FIRST_COMPLETED)
+        if reply.done():
+            closed.cancel()
+            try:
+                writer.write(json.dumps(reply.result()).encode() + b"\n")
+                await writer.drain()
+            except ConnectionError:
+                pass
+        else:
+            reply.cancel()
+        writer.close()
+
+    with open(f"{path}.lock", "w") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            raise SocketInUse(f"another engine service is serving {path}")
+
+        if os.path.exists(path):
+            # Left over from a worker that did not shut down cleanly.
+            os.unlink(path)
+        server = await asyncio.start_unix_server(handle, path)
+        inode = os.stat(path).st_ino
+        try:
+            async with server:
+                yield server
+        finally:
+            try:
+                if os.stat(path).st_ino == inode:
+                    os.unlink(path)
+            except FileNotFoundError:
+                pass
@@ -1,3 +1,3 @@
-from .engine import mcts_engine
+from .engine import mcts_engine, start_workers, stop_workers
 
-__all__ = ["mcts_engine"]
+__all__ = ["mcts_engine", "start_workers", "stop_workers"]
@@ -1,13 +1,33 @@
+import os
+
 import numpy as np
 
 from sidestacker import SideStacker
+from utils import LRUCache
 from .mcts import MCTS
+from .parallel import RootParallelMCTS
 
 sideStacker = SideStacker()
 
-args = {"C": 1.41, "num_searches": 1000}
+args = {
+    "C": 1.41,
+    "num_searches": 1000,
+    "rollout_batch": 128,
+    "tt_size": 100_000,
+    "reuse_games": 64,
+    "reuse_ttl": 600,
+    "threads": 1,
+    "early_stop": True,
+    "solver": True,
+    "workers": int(os.getenv("MCTS_WORKERS", "1")),
+}
 
 mcts = MCTS(sideStacker, args)
+# With more than one worker each move runs independent searches in a process
+# pool and merges their root visit counts; trees are not reused in that mode.
+pool = RootParallelMCTS(sideStacker, args) if args["workers"] > 1 else None
+
+trees = LRUCache(args["reuse_games"], args["reuse_ttl"])
 
 
 def convert_board(board, player_symbol):
@@ -23,10 +43,51 @@ def action_to_row_col(action: int, size=7):
     return row, col
 
 
-def mcts_engine(board, player_symbol):
+def start_workers():
+    if pool is not None:
+        pool.start()
+
+
+def stop_workers():
+    if pool is not None:
+        pool.shutdown()
+
+
+def reuse_tree(game_id, state):
+    previous = trees.pop(game_id)
+    if previous is None:
+        return None
+
+    previous_state, tree, action = previous
+    moves = sideStacker.get_moves_between(previous_state, state)
+    if moves is None or moves[0] != action:
+        return None
+
+    child = tree.find_child(0, action)
+    if child is None:
+        return None
+    grandchild = tree.find_child(child, moves[1])
+    if grandchild is None:
+        return None
+    return tree.extract(grandchild, args["num_searches"])
+
+
+def mcts_engine(board, player_symbol, game_id=None, deadline=None):
     state = convert_board(board, player_symbol)
     neutral_state = sideStacker.change_perspective(state, -1)
-    mcts_probs = mcts.search(neutral_state)
-    action = int(np.argmax(mcts_probs))
-    row, col = action_to_row_col(action)
-    return row, col
+
+    if pool is not None:
+        visits, searches = pool.search_visits(neutral_state, deadline)
+        return action_to_row_col(int(np.argmax(visits))), searches, visits
+
+    tree = None
+    if game_id is not None:
+        tree = reuse_tree(game_id, neutral_state)
+    if tree is None:
+        tree = mcts.new_tree(neutral_state)
+
+    visits, searches = mcts.search_visits(neutral_state, tree, deadline)
+    action = int(np.argmax(visits))
+    if game_id is not None:
+        trees.put(game_id, (neutral_state, tree, action))
+    return action_to_row_col(action), searches, visits
@@ -1,74 +1,49 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from threading import Lock
+
 import numpy as np
-import math
+
+from sidestacker import TranspositionTable
+from .rollout import rollout_batch
+from .tree import Tree
 
 
-class Node:
-    def __init__(self, game, args, state, parent=None, action_taken=None):
+class MCTS:
+    def __init__(self, game, args):
         self.game = game
         self.args = args
-        self.state = state
-        self.parent = parent
-        self.action_taken = action_taken
-
-        self.children = []
-        self.expandable_moves = game.get_valid_moves(state)
-
-        self.visit_count = 0
-        self.value_sum = 0
-
-    def is_fully_expanded(self):
-        return np.sum(self.expandable_moves) == 0 and len(self.children) > 0
-
-    def select(self):
-        best_child = None
-        best_ucb = -np.inf
-
-        for child in self.children:
-            ucb = self.get_ucb(child)
-            if ucb > best_ucb:
-                best_child = child
-                best_ucb = ucb
-
-        return best_child
-
-    def get_ucb(self, child):
-        q_value = 1 - ((child.value_sum / child.visit_count) + 1) / 2
-        return q_value + self.args["C"] * math.sqrt(
-            math.log(self.visit_count) / child.visit_count
-        )
-
-    def expand(self):
-        action = np.random.choice(np.where(self.expandable_moves == 1)[0])
-        self.expandable_moves[action] = 0
-
-        child_state = self.state.copy()
-        child_state = self.game.get_next_state(child_state, action, 1)
-        child_state = self.game.change_perspective(child_state, player=-1)
-
-        child = Node(self.game, self.args, child_state, self, action)
-        self.children.append(child)
-        return child
-
-    def simulate(self):
-        value, is_terminal = self.game.get_value_and_terminated(
-            self.state, self.action_taken
-        )
+        self.rng = np.random.default_rng(args.get("seed"))
+        if args.get("seed") is not None:
+            random.seed(args["seed"])
+        self.table = None
+        if args.get("tt_size"):
+            self.table = TranspositionTable(args["tt_size"])
+
+    def seed(self, seed):
+        random.seed(seed)
+        self.rng = np.random.default_rng(seed)
+
+    def new_tree(self, state):
+        tree = Tree.for_searches(self.args["num_searches"], self.table)
+        tree.add_root(self.game.get_canonical_hash(state))
+        return tree
+
+    def simulate(self, rollout):
+        # Plays the rollout position out in place.
+        value, is_terminal = rollout.get_value_and_terminated()
         value = self.game.get_opponent_value(value)
 
         if is_terminal:
             return value
 
-        rollout_state = self.state.copy()
         rollout_player = 1
         while True:
-            valid_moves = self.game.get_valid_moves(rollout_state)
-            action = np.random.choice(np.where(valid_moves == 1)[0])
-            rollout_state = self.game.get_next_state(
-                rollout_state, action, rollout_player
-            )
-            value, is_terminal = self.game.get_value_and_terminated(
-                rollout_state, action
-            )
+            action = random.choice(rollout.moves)
+            rollout.play(action)
+            value, is_terminal = rollout.get_value_and_terminated()
             if is_terminal:
                 if rollout_player == -1:
                     value = self.game.get_opponent_value(value)
@@ -76,45 +51,144 @@ class Node:
 
             rollout_player = self.game.get_opponent(rollout_player)
 
-    def backpropagate(self, value):
-        self.value_sum += value
-        self.visit_count += 1
-
-        value = self.game.get_opponent_value(value)
-        if self.parent is not None:
-            self.parent.backpropagate(value)
-
-
-class MCTS:
-    def __init__(self, game, args):
-        self.game = game
-        self.args = args
-
-    def search(self, state):
-        root = Node(self.game, self.args, state)
-
-        for search in range(self.args["num_searches"]):
-            node = root
-
-            while node is not None and node.is_fully_expanded():
-                node = node.select()
-
-            if node is None:
-                continue
+    def simulate_batch(self, boards, rng):
+        repeats = self.args.get("rollouts_per_leaf", 1)
+        values = rollout_batch(self.game, np.repeat(boards, repeats, axis=0), rng)
+        return values.reshape(len(boards), repeats).mean(axis=1)
+
+    def select_leaf(self, tree, position):
+        node = 0
+        path = [node]
+
+        while tree.is_fully_expanded(node) and not tree.proven[node]:
+            node = tree.select(node, self.args["C"])
+            position.play(tree.action[node])
+            path.append(node)
+
+        if tree.proven[node]:
+            return path, tree.proven[node], True
+
+        value, is_terminal = position.get_value_and_terminated()
+        if not is_terminal:
+            if tree.num_children[node] == 0 and tree.has_room(len(position.moves)):
+                moves = position.moves.copy()
+                random.shuffle(moves)
+                tree.add_children(node, moves)
+
+            if tree.num_children[node] > 0:
+                node = tree.expand(node)
+                position.play(tree.action[node])
+                tree.set_key(node, position.canonical_hash)
+                path.append(node)
+                value, is_terminal = position.get_value_and_terminated()
+
+        if is_terminal and value and self.args.get("solver"):
+            tree.prove(path)
+        return path, self.game.get_opponent_value(value), is_terminal
+
+    def search(self, state, tree=None, deadline=None):
+        action_probs, searches = self.search_visits(state, tree, deadline)
+        action_probs /= action_probs.sum()
+        return action_probs
 
-            value, is_terminal = self.game.get_value_and_terminated(
-                node.state, node.action_taken
+    def search_visits(self, state, tree=None, deadline=None):
+        # Runs until num_searches simulations or the time.monotonic()
+        # deadline, whichever comes first, and returns the root visit counts
+        # with the number of simulations completed.
+        position = self.game.get_position(state)
+        stop_at = None
+        if self.args.get("early_stop"):
+            action = position.forced_move()
+            if action is not None:
+                visits = np.zeros(self.game.action_size)
+                visits[action] = 1
+                return visits, 0
+
+        if tree is None:
+            tree = self.new_tree(state)
+        if self.args.get("early_stop"):
+            stop_at = tree.visit_count[0] + self.args["num_searches"]
+
+        threads = self.args.get("threads", 1)
+        if threads == 1:
+            searches = self.run_simulations(
+                tree,
+                position,
+                self.args["num_searches"],
+                self.rng,
+                nullcontext(),
+                deadline,
+                stop_at,
             )
-            value = self.game.get_opponent_value(value)
-
-            if not is_terminal:
-                node = node.expand()
-                value = node.simulate()
-
-            node.backpropagate(value)
-
-        action_probs = np.zeros(self.game.action_size)
-        for child in root.children:
-            action_probs[child.action_taken] = child.visit_count
-        action_probs /= np.sum(action_probs)
-        return action_probs
+        else:
+            # Tree parallelism: every thread descends the shared tree under
+            # the lock and plays its rollouts outside it.
+            lock = Lock()
+            share, extra = divmod(self.args["num_searches"], threads)
+            with ThreadPoolExecutor(threads) as executor:
+                futures = [
+                    executor.submit(
+                        self.run_simulations,
+                        tree,
+                        self.game.get_position(state),
+                        share + (thread < extra),
+                        rng,
+                        lock,
+                        deadline,
+                        stop_at,
+                    )
+                    for thread, rng in enumerate(self.rng.spawn(threads))
+                ]
+                searches = sum(future.result() for future in futures)
+
+        tree.flush()
+        return tree.root_visits(self.game.action_size), searches
+
+    def run_simulations(
+        self, tree, position, count, rng, lock, deadline=None, stop_at=None
+    ):
+        batch_size = self.args.get("rollout_batch", 1)
+        completed = 0
+        while completed < count:
+            # One rollout from each of up to batch_size distinct leaves,
+            # kept apart by virtual loss and played out in one kernel call.
+            leaves = []
+            rollouts = []
+            with lock:
+                for search in range(min(batch_size, count - completed)):
+                    path, value, is_terminal = self.select_leaf(tree, position)
+                    if not is_terminal:
+                        value = None
+                        rollouts.append(
+                            position.copy() if batch_size == 1 else position.to_board()
+                        )
+                    tree.apply_virtual_loss(path)
+                    leaves.append((path, value))
+
+                    while position.history:
+                        position.undo()
+
+            if batch_size == 1:
+                values = iter([self.simulate(rollout) for rollout in rollouts])
+            else:
+                values = iter(
+                    self.simulate_batch(np.stack(rollouts), rng) if rollouts else ()
+                )
+
+            with lock:
+                for path, value in leaves:
+                    tree.apply_virtual_loss(path, -1)
+                    tree.backpropagate(path, next(values) if value is None else value)
+                decided = tree.proven[0] or (
+                    stop_at is not None
+                    and tree.is_decided(stop_at - tree.visit_count[0])
+                )
+            completed += len(leaves)
+
+            if decided:
+                break
+
+            # Checked after each batch, so at least one always completes.
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        return completed
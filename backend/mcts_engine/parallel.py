@@ -0,0 +1,80 @@
+import multiprocessing
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from sidestacker import SideStacker
+from .mcts import MCTS
+
+# Set once per worker process by _init_worker and reused for every job.
+_mcts = None
+
+
+def _init_worker(args):
+    global _mcts
+    _mcts = MCTS(SideStacker(), dict(args))
+
+
+def _warmup(seed):
+    state = _mcts.game.get_initial_state()
+    return _search(state, 8, seed)
+
+
+def _search(state, num_searches, seed, deadline=None):
+    # time.monotonic() is system-wide, so the deadline holds across processes.
+    _mcts.seed(seed)
+    _mcts.args["num_searches"] = num_searches
+    return _mcts.search_visits(state, deadline=deadline)
+
+
+class RootParallelMCTS:
+    def __init__(self, game, args):
+        self.game = game
+        self.args = args
+        self.workers = args["workers"]
+        self.pool = None
+
+    def start(self):
+        if self.pool is None:
+            # Spawned rather than forked: the server process runs other
+            # threads (e.g. the inference server) that fork would copy mid-use.
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.args,),
+            )
+            # Forces every worker to start, import and run a small search now
+            # rather than on the first request.
+            list(self.pool.map(_warmup, range(self.workers)))
+        return self
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(cancel_futures=True)
+            self.pool = None
+
+    def search(self, state, deadline=None):
+        visits, searches = self.search_visits(state, deadline)
+        return visits / visits.sum()
+
+    def search_visits(self, state, deadline=None):
+        self.start()
+        share, extra = divmod(self.args["num_searches"], self.workers)
+        seed = random.getrandbits(32)
+        futures = [
+            self.pool.submit(
+                _search, state, share + (worker < extra), seed + worker, deadline
+            )
+            for worker in range(self.workers)
+            if share + (worker < extra) > 0
+        ]
+
+        visits = np.zeros(self.game.action_size)
+        searches = 0
+        for future in futures:
+            worker_visits, worker_searches = future.result()
+            visits += worker_visits
+            searches += worker_searches
+        return visits, searches
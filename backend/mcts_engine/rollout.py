@@ -0,0 +1,64 @@
+import numpy as np
+
+LINES = {
+    player: np.full(4, player, dtype=np.int8).view(np.int32)[0] for player in (1, -1)
+}
+
+
+def rollout_batch(game, states, rng):
+    # Plays one uniformly random game to the end from each board in states
+    # (K, 7, 7), all with player 1 to move. Returns the K results from
+    # player 1's point of view.
+    size = game.size
+    count = len(states)
+    boards = states.reshape(count, size * size).copy()
+
+    # Legal moves are the two ends of each row's run of empty cells; a row
+    # with one empty cell offers it only once, a full row not at all.
+    empty = states == 0
+    left = np.where(empty.any(axis=2), empty.argmax(axis=2), size)
+    right = size - 1 - empty[:, :, ::-1].argmax(axis=2)
+    empty_count = empty.sum(axis=(1, 2))
+
+    active = np.arange(count)
+    values = np.zeros(count)
+    player = 1
+
+    while len(active):
+        open_left = left <= right
+        candidates = np.concatenate([open_left, left < right], axis=1)
+        # Illegal candidates score below any draw, even one of exactly 0.0.
+        scores = np.where(
+            candidates, rng.random(candidates.shape, dtype=np.float32), -1.0
+        )
+        choice = np.argmax(scores, axis=1)
+        row = choice % size
+        from_left = choice < size
+
+        boards_index = np.arange(len(active))
+        col = np.where(
+            from_left, left[boards_index, row], right[boards_index, row]
+        )
+        left[boards_index, row] += from_left
+        right[boards_index, row] -= ~from_left
+        actions = row * size + col
+        boards[boards_index, actions] = player
+        empty_count -= 1
+
+        # Each line is four int8 cells; read as one int32 it equals LINES[player]
+        # exactly when all four belong to player.
+        cells = game.cell_lines[actions] + (boards_index * size * size)[:, None, None]
+        lines = np.take(boards, cells).view(np.int32)
+        wins = (lines == LINES[player]).any(axis=(1, 2))
+        values[active[wins]] = player
+
+        ongoing = ~wins & (empty_count > 0)
+        if not ongoing.all():
+            boards = boards[ongoing]
+            left = left[ongoing]
+            right = right[ongoing]
+            empty_count = empty_count[ongoing]
+            active = active[ongoing]
+        player = -player
+
+    return values
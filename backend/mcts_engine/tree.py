@@ -0,0 +1,223 @@
+import math
+from array import array
+
+import numpy as np
+
+# A node's children are one contiguous block, allocated with the node's legal
+# moves in random order the first time it is expanded. Children past
+# num_expanded are placeholders that have not been visited yet.
+MAX_CHILDREN = 14
+
+
+def _buffer(typecode: str, capacity: int, fill=0):
+    return array(typecode, [fill]) * capacity
+
+
+class Tree:
+    def __init__(self, capacity: int, num_slots: int, table=None):
+        self.capacity = capacity
+        self.table = table
+        self.size = 0
+
+        # Typed, preallocated buffers: scalar access from the search loop is
+        # as cheap as a list, and np.frombuffer gives zero-copy array views.
+        self.visit_count = _buffer("i", capacity)
+        self.parent = _buffer("i", capacity, -1)
+        self.action = _buffer("b", capacity, -1)
+        self.first_child = _buffer("i", capacity)
+        self.num_children = _buffer("b", capacity)
+        self.num_expanded = _buffer("b", capacity)
+        # Solver status for the player to move at the node: 1 proven win,
+        # -1 proven loss, 0 unknown.
+        self.proven = _buffer("b", capacity)
+
+        # Value sums are kept per canonical position rather than per node, so
+        # every node that reaches the same position shares one estimate.
+        # stat[node] points into the stat_* buffers. Only expanded nodes get
+        # a slot, so there are at most one per simulation plus the root.
+        self.stat = _buffer("i", capacity)
+        self.stat_visits = _buffer("d", num_slots)
+        self.stat_values = _buffer("d", num_slots)
+        self.slots = {}
+        self.keys = []
+        self.entries = []
+
+    @classmethod
+    def for_searches(cls, num_searches: int, table=None):
+        return cls(1 + num_searches * MAX_CHILDREN, 1 + num_searches, table)
+
+    def add_root(self, key: int) -> int:
+        self.size = 1
+        self.set_key(0, key)
+        return 0
+
+    def has_room(self, count: int) -> bool:
+        return self.size + count <= self.capacity
+
+    def is_fully_expanded(self, node: int) -> bool:
+        return 0 < self.num_children[node] == self.num_expanded[node]
+
+    def add_children(self, node: int, actions):
+        first = self.size
+        count = len(actions)
+        self.size += count
+        self.parent[first : first + count] = array("i", [node]) * count
+        self.action[first : first + count] = array("b", actions)
+        self.first_child[node] = first
+        self.num_children[node] = count
+
+    def expand(self, node: int) -> int:
+        child = self.first_child[node] + self.num_expanded[node]
+        self.num_expanded[node] += 1
+        return child
+
+    def find_child(self, node: int, action: int):
+        first = self.first_child[node]
+        for child in range(first, first + self.num_expanded[node]):
+            if self.action[child] == action:
+                return child
+        return None
+
+    def extract(self, node: int, num_searches: int) -> "Tree":
+        # Copy the subtree under node into a fresh tree with room for another
+        # num_searches simulations; node becomes the new root.
+        order = [node]
+        size = 1
+        for current in order:
+            first = self.first_child[current]
+            size += self.num_children[current]
+            order.extend(range(first, first + self.num_expanded[current]))
+
+        tree = Tree(
+            size + num_searches * MAX_CHILDREN, len(order) + num_searches, self.table
+        )
+        tree.size = 1
+        mapping = {node: 0}
+        for current in order:
+            new = mapping[current]
+            slot = self.stat[current]
+            tree.set_key(new, self.keys[slot])
+            tree.stat_visits[tree.stat[new]] = self.stat_visits[slot]
+            tree.stat_values[tree.stat[new]] = self.stat_values[slot]
+            tree.visit_count[new] = self.visit_count[current]
+            tree.proven[new] = self.proven[current]
+
+            count = self.num_children[current]
+            if count:
+                first = self.first_child[current]
+                new_first = tree.size
+                tree.add_children(new, self.action[first : first + count])
+                tree.num_expanded[new] = self.num_expanded[current]
+                for offset in range(self.num_expanded[current]):
+                    mapping[first + offset] = new_first + offset
+        return tree
+
+    def set_key(self, node: int, key: int):
+        self.stat[node] = self._slot(key)
+
+    def select(self, node: int, C: float) -> int:
+        visit_count = self.visit_count
+        proven = self.proven
+        stat = self.stat
+        stat_visits = self.stat_visits
+        stat_values = self.stat_values
+        log_visits = math.log(visit_count[node])
+
+        best_child = -1
+        best_ucb = -math.inf
+        first = self.first_child[node]
+        for child in range(first, first + self.num_children[node]):
+            # A proven win for the opponent is never worth another visit.
+            if proven[child] == 1:
+                continue
+            slot = stat[child]
+            q_value = 1 - ((stat_values[slot] / stat_visits[slot]) + 1) / 2
+            ucb = q_value + C * math.sqrt(log_visits / visit_count[child])
+            if ucb > best_ucb:
+                best_child = child
+                best_ucb = ucb
+
+        return best_child
+
+    def prove(self, path):
+        # path ends at a won terminal position, which the player to move there
+        # has lost. A parent is won if any child is lost, and lost once every
+        # legal move (all children are allocated together) is a win.
+        proven = self.proven
+        proven[path[-1]] = -1
+        for node in reversed(path[:-1]):
+            first = self.first_child[node]
+            children = proven[first : first + self.num_children[node]]
+            if -1 in children:
+                proven[node] = 1
+            elif children.count(1) == len(children):
+                proven[node] = -1
+            else:
+                break
+
+    def backpropagate(self, path, value: float):
+        # Walk from the leaf up; each level sees the other player's value.
+        for node in reversed(path):
+            self.visit_count[node] += 1
+            slot = self.stat[node]
+            self.stat_visits[slot] += 1
+            self.stat_values[slot] += value
+            value = -value
+
+    def apply_virtual_loss(self, path, sign: int = 1):
+        # Counts a pending visit as a loss for the player who chose each
+        # node, steering other in-flight descents elsewhere. Call again with
+        # sign=-1 before backpropagating the real result.
+        for node in path:
+            self.visit_count[node] += sign
+            slot = self.stat[node]
+            self.stat_visits[slot] += sign
+            self.stat_values[slot] += sign
+
+    def is_decided(self, remaining: int) -> bool:
+        # True once no root child can overtake the most visited one within
+        # the remaining simulations, so the argmax is already final.
+        first = self.first_child[0]
+        visits = sorted(self.visit_count[first : first + self.num_children[0]])
+        if not visits:
+            return False
+        runner_up = visits[-2] if len(visits) > 1 else 0
+        return visits[-1] - runner_up > remaining
+
+    def root_visits(self, action_size: int) -> np.ndarray:
+        first = self.first_child[0]
+        children = slice(first, first + self.num_children[0])
+        visits = np.zeros(action_size)
+        actions = np.frombuffer(self.action, dtype=np.int8)[children]
+        counts = np.frombuffer(self.visit_count, dtype=np.int32)[children]
+        proven = np.frombuffer(self.proven, dtype=np.int8)[children]
+        # Keep only proven winning moves if there are any, and drop proven
+        # losing moves unless nothing else is left.
+        if self.proven[0] == 1:
+            counts = np.where(proven == -1, counts, 0)
+        elif self.proven[0] == 0:
+            counts = np.where(proven == 1, 0, counts)
+        visits[actions] = counts
+        return visits
+
+    def flush(self):
+        if self.table is None:
+            return
+        for slot, entry in enumerate(self.entries):
+            entry.visit_count = int(self.stat_visits[slot])
+            entry.value_sum = self.stat_values[slot]
+
+    def _slot(self, key: int) -> int:
+        slot = self.slots.get(key)
+        if slot is not None:
+            return slot
+
+        slot = len(self.slots)
+        self.slots[key] = slot
+        self.keys.append(key)
+        if self.table is not None:
+            entry = self.table.lookup(key)
+            self.entries.append(entry)
+            self.stat_visits[slot] = entry.visit_count
+            self.stat_values[slot] = entry.value_sum
+        return slot
@@ -1,3 +1,13 @@
+from . import bitboard, symmetry, zobrist
+from .position import Position
 from .sidestacker import SideStacker
+from .transposition import TranspositionTable
 
-__all__ = ["SideStacker"]
+__all__ = [
+    "Position",
+    "SideStacker",
+    "TranspositionTable",
+    "bitboard",
+    "symmetry",
+    "zobrist",
+]
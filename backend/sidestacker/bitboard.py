@@ -0,0 +1,64 @@
+import numpy as np
+from numpy.typing import NDArray
+
+from .constants import SIZE
+
+type Bitboard = int
+
+# One spare bit per row keeps horizontal and diagonal shifts from wrapping
+# into the next row.
+STRIDE = SIZE + 1
+ROW_MASK = (1 << SIZE) - 1
+ROW_SHIFTS = tuple(row * STRIDE for row in range(SIZE))
+BOARD_MASK = sum(ROW_MASK << shift for shift in ROW_SHIFTS)
+DIRECTIONS = (1, STRIDE, STRIDE + 1, STRIDE - 1)
+
+ACTION_BITS = tuple(
+    1 << (action // SIZE * STRIDE + action % SIZE) for action in range(SIZE * SIZE)
+)
+
+
+def from_board(cells: NDArray[np.bool_]) -> Bitboard:
+    packed = np.packbits(cells, axis=-1, bitorder="little")
+    return int.from_bytes(packed.tobytes(), "little")
+
+
+def to_mask(bits: Bitboard) -> NDArray[np.uint8]:
+    packed = np.frombuffer(bits.to_bytes(SIZE, "little"), dtype=np.uint8)
+    mask = np.unpackbits(
+        packed.reshape(SIZE, 1), axis=-1, count=SIZE, bitorder="little"
+    )
+    return mask.flatten()
+
+
+def get_valid_moves(occupied: Bitboard) -> Bitboard:
+    moves = 0
+    for shift in ROW_SHIFTS:
+        empty = ~(occupied >> shift) & ROW_MASK
+        if empty:
+            left = empty & -empty
+            right = 1 << (empty.bit_length() - 1)
+            moves |= (left | right) << shift
+    return moves
+
+
+def check_win(bits: Bitboard, action: int) -> bool:
+    if action is None:
+        return False
+
+    bit = ACTION_BITS[action]
+    if not bits & bit:
+        return False
+
+    # Two doublings of a pair give the start of every run of TARGET (= 4).
+    for step in DIRECTIONS:
+        pairs = bits & (bits >> step)
+        starts = pairs & (pairs >> 2 * step)
+        if starts:
+            covered = starts | (starts << step)
+            covered |= covered << 2 * step
+            if covered & bit:
+                return True
+
+    return False
+
@@ -0,0 +1,2 @@
+SIZE = 7
+TARGET = 4
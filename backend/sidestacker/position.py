@@ -0,0 +1,171 @@
+import numpy as np
+from numpy.typing import NDArray
+
+from . import bitboard, zobrist
+from .constants import SIZE
+
+
+class Position:
+    def __init__(self):
+        self.size = SIZE
+        self.stones = {1: 0, -1: 0}
+        self.player = 1
+        self.history = []
+        self.empty = SIZE * SIZE
+        self.keys = 0
+
+        # Empty cells of a row are always one contiguous run, so a row is
+        # fully described by its leftmost and rightmost empty column.
+        self.left = [0] * SIZE
+        self.right = [SIZE - 1] * SIZE
+
+        self.moves = []
+        self._slots = {}
+        for row in range(SIZE):
+            for action in self._row_moves(row):
+                self._add_move(action)
+
+    @classmethod
+    def from_board(cls, state, player=1):
+        position = cls()
+        position.stones = {
+            1: bitboard.from_board(state == 1),
+            -1: bitboard.from_board(state == -1),
+        }
+        position.player = player
+        position.keys = zobrist.pack_board(state, player)
+        position.empty = int(np.count_nonzero(state == 0))
+
+        occupied = position.stones[1] | position.stones[-1]
+        position.moves = []
+        position._slots = {}
+        for row, shift in enumerate(bitboard.ROW_SHIFTS):
+            empty = ~(occupied >> shift) & bitboard.ROW_MASK
+            if empty:
+                position.left[row] = (empty & -empty).bit_length() - 1
+                position.right[row] = empty.bit_length() - 1
+            else:
+                position.left[row] = SIZE
+                position.right[row] = SIZE - 1
+            for action in position._row_moves(row):
+                position._add_move(action)
+        return position
+
+    def copy(self):
+        position = Position.__new__(Position)
+        position.size = self.size
+        position.stones = self.stones.copy()
+        position.player = self.player
+        position.history = self.history.copy()
+        position.empty = self.empty
+        position.keys = self.keys
+        position.left = self.left.copy()
+        position.right = self.right.copy()
+        position.moves = self.moves.copy()
+        position._slots = self._slots.copy()
+        return position
+
+    def play(self, action: int):
+        row, col = divmod(action, self.size)
+        before = self._row_moves(row)
+        if col == self.left[row]:
+            self.left[row] += 1
+        else:
+            self.right[row] -= 1
+        self._update_moves(before, self._row_moves(row))
+
+        self.stones[self.player] |= bitboard.ACTION_BITS[action]
+        self.keys ^= zobrist.PACKED_MOVE_KEYS[self.player][action]
+        self.empty -= 1
+        self.history.append(action)
+        self.player = -self.player
+
+    def undo(self) -> int:
+        action = self.history.pop()
+        self.player = -self.player
+        self.empty += 1
+        self.stones[self.player] &= ~bitboard.ACTION_BITS[action]
+        self.keys ^= zobrist.PACKED_MOVE_KEYS[self.player][action]
+
+        row, col = divmod(action, self.size)
+        before = self._row_moves(row)
+        if col == self.left[row] - 1:
+            self.left[row] -= 1
+        else:
+            self.right[row] += 1
+        self._update_moves(before, self._row_moves(row))
+        return action
+
+    @property
+    def hash(self) -> int:
+        return self.keys & zobrist.LANE_MASK
+
+    @property
+    def canonical_hash(self) -> int:
+        return zobrist.canonical(self.keys)
+
+    @property
+    def canonical_symmetry(self) -> tuple[int, int]:
+        return zobrist.canonical_symmetry(self.keys)
+
+    def canonical_hash_after(self, action: int) -> int:
+        return zobrist.canonical(
+            self.keys ^ zobrist.PACKED_MOVE_KEYS[self.player][action]
+        )
+
+    def to_board(self):
+        board = bitboard.to_mask(self.stones[self.player]).astype(np.int8)
+        board -= bitboard.to_mask(self.stones[-self.player]).astype(np.int8)
+        return board.reshape(self.size, self.size)
+
+    def get_valid_moves(self) -> NDArray[np.uint8]:
+        mask = np.zeros((self.size * self.size,), dtype=np.uint8)
+        mask[self.moves] = 1
+        return mask
+
+    def get_value_and_terminated(self):
+        if self.history and bitboard.check_win(
+            self.stones[-self.player], self.history[-1]
+        ):
+            return 1, True
+        if self.empty == 0:
+            return 0, True
+        return 0, False
+
+    def forced_move(self):
+        # The only legal move, or a move that wins on the spot.
+        if len(self.moves) == 1:
+            return self.moves[0]
+        stones = self.stones[self.player]
+        for action in self.moves:
+            if bitboard.check_win(stones | bitboard.ACTION_BITS[action], action):
+                return action
+        return None
+
+    def _row_moves(self, row: int):
+        left = self.left[row]
+        right = self.right[row]
+        if left > right:
+            return ()
+        if left == right:
+            return (row * self.size + left,)
+        return (row * self.size + left, row * self.size + right)
+
+    def _update_moves(self, before, after):
+        for action in before:
+            if action not in after:
+                self._remove_move(action)
+        for action in after:
+            if action not in before:
+                self._add_move(action)
+
+    def _add_move(self, action: int):
+        self._slots[action] = len(self.moves)
+        self.moves.append(action)
+
+    def _remove_move(self, action: int):
+        slot = self._slots.pop(action)
+        last = self.moves.pop()
+        if last != action:
+            self.moves[slot] = last
+            self._slots[last] = slot
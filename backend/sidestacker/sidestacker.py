@@ -1,8 +1,9 @@
 import numpy as np
 from numpy.typing import NDArray
 
-SIZE = 7
-TARGET = 4
+from . import bitboard, symmetry, zobrist
+from .constants import SIZE, TARGET
+from .position import Position
 
 type Board = NDArray[np.int8]
 
@@ -15,32 +16,72 @@ class SideStacker:
         self.target = TARGET
         self.action_size = self.size * self.size
 
+        self.win_lines, self.cell_lines = self._build_win_lines()
+
+    def _build_win_lines(self):
+        lines = []
+        for row in range(self.size):
+            for col in range(self.size):
+                for d_row, d_col in [(0, 1), (1, 0), (1, 1), (-1, 1)]:
+                    end_row = row + (self.target - 1) * d_row
+                    end_col = col + (self.target - 1) * d_col
+                    if 0 <= end_row < self.size and 0 <= end_col < self.size:
+                        lines.append(
+                            [
+                                (row + k * d_row) * self.size + col + k * d_col
+                                for k in range(self.target)
+                            ]
+                        )
+
+        # Cells on the edge lie on fewer lines; repeating one keeps the table
+        # rectangular without changing any answer.
+        per_cell = [[line for line in lines if cell in line] for cell in range(self.action_size)]
+        width = max(len(cell_lines) for cell_lines in per_cell)
+        cell_lines = [
+            cell_lines + [cell_lines[0]] * (width - len(cell_lines))
+            for cell_lines in per_cell
+        ]
+        return np.array(lines, dtype=np.intp), np.array(cell_lines, dtype=np.intp)
+
     def __repr__(self):
         return "SideStacker"
 
     def get_initial_state(self) -> Board:
         return np.zeros((self.size, self.size), dtype=np.int8)
 
+    def get_position(self, state: Board, player: int = 1) -> Position:
+        return Position.from_board(state, player)
+
     def get_next_state(self, state: Board, action: int, player: int) -> Board:
         row = action // self.column_count
         col = action % self.column_count
         state[row, col] = player
         return state
 
+    def get_next_state_batch(
+        self, states: NDArray[np.int8], actions: NDArray[np.intp], players
+    ) -> NDArray[np.int8]:
+        rows, cols = np.divmod(actions, self.column_count)
+        states[np.arange(len(states)), rows, cols] = players
+        return states
+
     def get_valid_moves(self, state=None) -> NDArray[np.uint8]:
         if state is None:
             state = np.zeros((self.size, self.size), dtype=np.int8)
 
-        mask = np.zeros((self.size, self.size), dtype=np.uint8)
-        for i, row in enumerate(state):
-            zero_indices = np.flatnonzero(row == 0)
-            if zero_indices.size:
-                left = zero_indices[0]
-                right = zero_indices[-1]
-                mask[i, left] = 1
-                if left != right:
-                    mask[i, right] = 1
-        return mask.flatten()
+        occupied = bitboard.from_board(state != 0)
+        return bitboard.to_mask(bitboard.get_valid_moves(occupied))
+
+    def get_valid_moves_batch(self, states: NDArray[np.int8]) -> NDArray[np.uint8]:
+        empty = states == 0
+        boards, rows = np.nonzero(empty.any(axis=2))
+        left = empty[boards, rows].argmax(axis=1)
+        right = self.column_count - 1 - empty[boards, rows, ::-1].argmax(axis=1)
+
+        mask = np.zeros(states.shape, dtype=np.uint8)
+        mask[boards, rows, left] = 1
+        mask[boards, rows, right] = 1
+        return mask.reshape(len(states), self.action_size)
 
     def check_win(self, state: Board, action: int) -> bool:
         if action is None:
@@ -52,9 +93,10 @@ class SideStacker:
         if player == 0:
             return False
 
-        directions = [(0, 1), (1, 0), (1, 1), (-1, 1)]
-
-        for di, dj in directions:
+        # Walks the four lines through action on the board as given; packing
+        # the whole board into a bitboard first costs more than it saves for
+        # one check. Position keeps its stones packed and uses bitboard.check_win.
+        for di, dj in [(0, 1), (1, 0), (1, 1), (-1, 1)]:
             count = 1
             for sign in [1, -1]:
                 x, y = i + sign * di, j + sign * dj
@@ -72,41 +114,59 @@ class SideStacker:
 
         return False
 
+    def check_win_batch(
+        self, states: NDArray[np.int8], actions: NDArray[np.intp]
+    ) -> NDArray[np.bool_]:
+        flat = states.reshape(len(states), self.action_size)
+        boards = np.arange(len(states))
+        player = flat[boards, actions]
+        lines = flat[boards[:, None, None], self.cell_lines[actions]]
+        return (lines == player[:, None, None]).all(axis=2).any(axis=1) & (player != 0)
+
+    def wins_if_played(
+        self, state: Board, cells: NDArray[np.intp], player: int
+    ) -> NDArray[np.bool_]:
+        """Whether player placing a stone on each of cells would complete a
+        line through it. Occupied cells cannot be played and answer False,
+        whoever holds them."""
+        flat = state.ravel()
+        lines = self.cell_lines[cells]
+        owned = (flat[lines] == player) | (lines == cells[:, None, None])
+        return owned.all(axis=2).any(axis=1) & (flat[cells] == 0)
+
     def winning_moves(self, state: Board, player: int) -> NDArray[np.uint8]:
         mask = np.zeros((self.size * self.size,), dtype=np.uint8)
-        valid_mask = self.get_valid_moves(state)
-
-        for idx in np.flatnonzero(valid_mask):
-            row, col = idx // self.column_count, idx % self.column_count
-            original = state[row, col]
-            state[row, col] = player
-            if self.check_win(state, idx):
-                mask[idx] = 1
-            state[row, col] = original
-
+        valid_moves = np.flatnonzero(self.get_valid_moves(state))
+        mask[valid_moves] = self.wins_if_played(state, valid_moves, player)
         return mask
 
     def blocking_moves(self, state: Board, player: int) -> NDArray[np.uint8]:
-        mask = np.zeros((self.size * self.size,), dtype=np.uint8)
-        valid_mask = self.get_valid_moves(state)
-
-        for idx in np.flatnonzero(valid_mask):
-            row, col = idx // self.column_count, idx % self.column_count
-            original = state[row, col]
-            state[row, col] = -player
-            if self.check_win(state, idx):
-                mask[idx] = 1
-            state[row, col] = original
-
-        return mask
+        return self.winning_moves(state, -player)
 
     def get_value_and_terminated(self, state: Board, action: int):
         if self.check_win(state, action):
             return 1, True
-        if not self.get_valid_moves(state).any():
+        if bitboard.from_board(state != 0) == bitboard.BOARD_MASK:
             return 0, True
         return 0, False
 
+    def get_value_and_terminated_batch(
+        self, states: NDArray[np.int8], actions: NDArray[np.intp]
+    ):
+        wins = self.check_win_batch(states, actions)
+        full = ~(states == 0).any(axis=(1, 2))
+        return wins.astype(np.int8), wins | full
+
+    def get_moves_between(self, previous: Board, state: Board):
+        changed = np.flatnonzero(previous.ravel() != state.ravel())
+        if len(changed) != 2 or previous.ravel()[changed].any():
+            return None
+
+        stones = state.ravel()[changed]
+        if sorted(stones) != [-1, 1]:
+            return None
+        return int(changed[stones == 1][0]), int(changed[stones == -1][0])
+
     def get_opponent(self, player: int):
         return -player
 
@@ -116,5 +176,26 @@ class SideStacker:
     def change_perspective(self, state: Board, player: int):
         return state * player
 
+    def get_canonical_state(self, state: Board, player: int = 1):
+        # Picks the mirror the way Position.canonical_symmetry does, so the
+        # board, its hash and any cache keyed on either all agree.
+        _, index = zobrist.canonical_symmetry(zobrist.pack_board(state, player))
+        return np.ascontiguousarray(symmetry.transform_board(state, index)), index
+
+    def get_canonical_hash(self, state: Board, player: int = 1) -> int:
+        return zobrist.canonical(zobrist.pack_board(state, player))
+
+    def transform_action(self, action: int, symmetry_index: int) -> int:
+        return int(symmetry.ACTION_MAPS[symmetry_index][action])
+
+    def transform_policy(self, policy, symmetry_index: int):
+        return policy[..., symmetry.ACTION_MAPS[symmetry_index]]
+
     def get_encoded_state(self, state: Board) -> NDArray[np.float32]:
-        return np.array([state == -1, state == 0, state == 1], dtype=np.float32)
+        encoded_state = np.array(
+            [state == -1, state == 0, state == 1], dtype=np.float32
+        )
+        if len(state.shape) == 3:
+            encoded_state = np.swapaxes(encoded_state, 0, 1)
+
+        return encoded_state
@@ -0,0 +1,25 @@
+import numpy as np
+
+from .constants import SIZE
+
+# Bit 0 mirrors left/right (columns), bit 1 mirrors top/bottom (rows). Every
+# element is its own inverse, so the same table maps actions both ways.
+SYMMETRIES = 4
+IDENTITY = 0
+
+
+def transform_board(state, symmetry: int):
+    if symmetry & 1:
+        state = state[..., ::-1]
+    if symmetry & 2:
+        state = state[..., ::-1, :]
+    return state
+
+
+ACTION_MAPS = np.stack(
+    [
+        transform_board(np.arange(SIZE * SIZE).reshape(SIZE, SIZE), symmetry).ravel()
+        for symmetry in range(SYMMETRIES)
+    ]
+)
+
@@ -0,0 +1,61 @@
+import threading
+from collections import OrderedDict
+
+
+class Entry:
+    __slots__ = ("visit_count", "value_sum")
+
+    def __init__(self):
+        self.visit_count = 0
+        self.value_sum = 0
+
+
+class TranspositionTable:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.entries: OrderedDict[int, Entry] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        # Concurrent searches on one engine share the table; lookups and
+        # updates to its entries go through this lock.
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, key: int) -> Entry:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return entry
+
+            self.misses += 1
+            entry = Entry()
+            self.entries[key] = entry
+            if len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+            return entry
+
+    def add(self, entry: Entry, visits: int, value: float):
+        # Searches running in other threads may update the same entry.
+        with self.lock:
+            entry.visit_count += visits
+            entry.value_sum += value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
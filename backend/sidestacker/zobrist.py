@@ -0,0 +1,64 @@
+import random
+
+import numpy as np
+
+from .constants import SIZE
+from .symmetry import ACTION_MAPS, SYMMETRIES
+
+# Fixed seed: hashes must agree across processes and restarts.
+_random = random.Random(0x5EED)
+
+PIECE_KEYS = {
+    player: tuple(_random.getrandbits(64) for _ in range(SIZE * SIZE))
+    for player in (1, -1)
+}
+TURN_KEY = _random.getrandbits(64)
+
+# A packed key holds one 64-bit lane per symmetry: lane s is the hash of the
+# board mirrored by s. One XOR keeps all four up to date, and the smallest
+# lane is the same for every mirror image of a position.
+LANE = 64
+LANE_MASK = (1 << LANE) - 1
+PACKED_TURN_KEY = sum(TURN_KEY << (LANE * symmetry) for symmetry in range(SYMMETRIES))
+PACKED_MOVE_KEYS = {
+    player: tuple(
+        PACKED_TURN_KEY
+        ^ sum(
+            keys[ACTION_MAPS[symmetry][action]] << (LANE * symmetry)
+            for symmetry in range(SYMMETRIES)
+        )
+        for action in range(SIZE * SIZE)
+    )
+    for player, keys in PIECE_KEYS.items()
+}
+
+
+def hash_board(state, player=1) -> int:
+    key = TURN_KEY if player == -1 else 0
+    for stone in (1, -1):
+        for action in np.flatnonzero(state == stone):
+            key ^= PIECE_KEYS[stone][action]
+    return key
+
+
+def pack_board(state, player=1) -> int:
+    key = PACKED_TURN_KEY if player == -1 else 0
+    for stone in (1, -1):
+        for action in np.flatnonzero(state == stone):
+            key ^= PACKED_MOVE_KEYS[stone][action] ^ PACKED_TURN_KEY
+    return key
+
+
+def canonical(packed: int) -> int:
+    return min(
+        (packed >> (LANE * symmetry)) & LANE_MASK for symmetry in range(SYMMETRIES)
+    )
+
+
+def canonical_symmetry(packed: int) -> tuple[int, int]:
+    # The canonical key and the symmetry whose lane it came from, i.e. the
+    # mirror that turns the position into its canonical form.
+    return min(
+        ((packed >> (LANE * symmetry)) & LANE_MASK, symmetry)
+        for symmetry in range(SYMMETRIES)
+    )
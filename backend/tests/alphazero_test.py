@@ -0,0 +1,239 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pytest
+import torch
+
+from alphazero_engine import engine, quantize
+from alphazero_engine.backends import load_backend, sample_positions, verify
+from alphazero_engine.engine import args
+from alphazero_engine.engine import sideStacker as game
+from alphazero_engine.inference import InferenceServer
+from alphazero_engine.mcts import MCTS
+from alphazero_engine.quantize import check
+from sidestacker import symmetry
+
+checkpoint = engine.load_engine()["hard"]
+model = checkpoint.model
+
+
+def test_threaded_search_undoes_virtual_loss():
+    state = game.get_initial_state()
+    state[2, :3] = 1
+    state[5, :3] = -1
+    mcts = MCTS(
+        game, {**args, "num_searches": 64, "threads": 4, "early_stop": False}, model
+    )
+    root = mcts.new_root(state)
+    probs = mcts.search(state, root)
+    assert np.isclose(probs.sum(), 1)
+    assert root.visit_count == 1 + 64
+    children = [child for child in root.children if child is not None]
+    assert root.child_visits.sum() == 64
+    assert sum(child.visit_count for child in children) == 64
+    assert np.isclose(root.value_sum, -sum(child.value_sum for child in children))
+
+
+def searched_table_snapshot(mcts, state):
+    root = mcts.new_root(state)
+    mcts.search(state, root)
+
+    def snapshot():
+        return {
+            key: (entry.visit_count, entry.value_sum)
+            for key, entry in mcts.table.entries.items()
+        }
+
+    return root, snapshot
+
+
+def test_virtual_loss_stays_out_of_transposition_table():
+    state = game.get_initial_state()
+    mcts = MCTS(game, {**args, "num_searches": 64, "early_stop": False}, model)
+    root, snapshot = searched_table_snapshot(mcts, state)
+    before = snapshot()
+    node = root
+    while node.is_fully_expanded() and any(node.children):
+        node = max(
+            (child for child in node.children if child is not None),
+            key=lambda child: child.visit_count,
+        )
+    assert node is not root
+    node.apply_virtual_loss()
+    assert snapshot() == before
+    node.apply_virtual_loss(-1)
+    assert snapshot() == before
+
+
+def test_interrupted_batch_leaves_transposition_table_alone(monkeypatch):
+    # A batch that fails between collecting its leaves and backpropagating
+    # them leaves its virtual losses in the tree, never in the table.
+    state = game.get_initial_state()
+    mcts = MCTS(game, {**args, "num_searches": 64, "early_stop": False}, model)
+    root, snapshot = searched_table_snapshot(mcts, state)
+    before = snapshot()
+
+    def fail(leaves):
+        raise RuntimeError("evaluation failed")
+
+    monkeypatch.setattr(mcts, "evaluate", fail)
+    with pytest.raises(RuntimeError):
+        mcts.search(state, root)
+    after = snapshot()
+    assert {key: after[key] for key in before} == before
+    assert all(stats == (0, 0) for key, stats in after.items() if key not in before)
+
+
+def test_deadline_returns_after_one_simulation():
+    state = game.get_initial_state()
+    mcts = MCTS(game, {**args, "tt_size": 0, "eval_batch": 1}, model)
+    visits, searches = mcts.search_visits(state, deadline=time.monotonic())
+    assert searches == 1 and visits.sum() == 1
+
+
+def test_cancel_stops_search_after_one_batch():
+    state = game.get_initial_state()
+    mcts = MCTS(game, {**args, "num_searches": 1000, "early_stop": False}, model)
+    cancel = threading.Event()
+    cancel.set()
+    _, searches = mcts.search_visits(state, cancel=cancel)
+    assert searches == args["eval_batch"]
+
+
+def test_solver_proves_forced_win():
+    position = game.get_position(game.get_initial_state())
+    for action in (35, 41, 21, 7, 22, 20):
+        position.play(action)
+    state = position.to_board()
+
+    mcts = MCTS(game, {**args, "num_searches": 600, "early_stop": False}, model)
+    root = mcts.new_root(state)
+    visits, searches = mcts.search_visits(state, root)
+    assert root.proven == 1 and searches < 600
+    assert int(np.argmax(visits)) == 28
+
+
+def test_children_are_built_on_first_visit():
+    state = game.get_initial_state()
+    mcts = MCTS(game, {**args, "num_searches": 3, "early_stop": False}, model)
+    root = mcts.new_root(state)
+    mcts.search(state, root)
+    assert len(root.actions) == 14
+    built = [child for child in root.children if child is not None]
+    assert len(built) == np.count_nonzero(root.child_visits) <= 3
+    for child in built:
+        assert root.actions[child.index] == child.action_taken
+        assert root.get_child(child.action_taken) is child
+
+
+def test_batched_evaluation_counts_every_leaf():
+    state = game.get_initial_state()
+    mcts = MCTS(
+        game, {**args, "num_searches": 64, "eval_batch": 8, "early_stop": False}, model
+    )
+    root = mcts.new_root(state)
+    visits, searches = mcts.search_visits(state, root)
+    assert searches == 64 and visits.sum() == 64
+    assert root.visit_count == 1 + 64
+
+
+def test_evaluation_cache_serves_mirror_images():
+    mcts = MCTS(game, {**args, "eval_cache_bytes": 2**20}, model)
+    uncached = MCTS(game, {**args, "eval_cache_bytes": 0}, model)
+    state = game.get_initial_state()
+    state[1, 0] = 1
+    state[3, 6] = -1
+    mirror = symmetry.transform_board(state, 3).copy()
+
+    [(policy, value)] = mcts.evaluate([(state, game.get_position(state))])
+    [(expected, expected_value)] = uncached.evaluate(
+        [(state, game.get_position(state))]
+    )
+    assert np.allclose(policy, expected) and value == expected_value
+
+    [(mirror_policy, mirror_value)] = mcts.evaluate(
+        [(mirror, game.get_position(mirror))]
+    )
+    assert mcts.evaluations.stats()["hits"] == 1
+    assert np.allclose(mirror_policy, game.transform_policy(policy, 3))
+    assert mirror_value == value
+
+
+def test_inference_server_matches_model():
+    server = InferenceServer(model, max_batch=8, max_wait=0.05)
+    states = [game.get_initial_state() for _ in range(4)]
+    for index, state in enumerate(states):
+        state[index, 0] = 1
+    encoded = [
+        torch.tensor(game.get_encoded_state(state)).unsqueeze(0) for state in states
+    ]
+    with ThreadPoolExecutor(4) as executor:
+        results = list(executor.map(server, encoded))
+
+    with torch.no_grad():
+        for tensor, (policy, value) in zip(encoded, results):
+            expected_policy, expected_value = model(tensor)
+            assert torch.allclose(policy, expected_policy, atol=1e-5)
+            assert torch.allclose(value, expected_value, atol=1e-5)
+    assert server.stats()["rows"] == 4
+
+
+def test_inference_server_restarts_after_idle():
+    server = InferenceServer(model, idle=0.01)
+    encoded = torch.zeros((1, 3, 7, 7), device=model.device)
+    server(encoded)
+    time.sleep(0.1)
+    assert server.worker is None
+    policy, _ = server(encoded)
+    assert policy.shape == (1, game.action_size)
+
+
+@pytest.mark.parametrize("name", ["torchscript", "onnx"])
+def test_exported_backends_match_eager_model(name, tmp_path):
+    if name == "onnx":
+        pytest.importorskip("onnxruntime")
+    backend = load_backend(name, model, tmp_path / f"model.{name}")
+    policy_error, value_error = verify(backend, model, game)
+    assert policy_error < 1e-3 and value_error < 1e-3
+
+
+def test_fused_model_matches_model():
+    policy_error, value_error = verify(load_backend("fused", model), model, game)
+    assert policy_error < 1e-4 and value_error < 1e-4
+
+
+@pytest.mark.parametrize("name", ["int8", "onnx-int8"])
+def test_quantized_backends_stay_close_to_model(name, tmp_path):
+    if name == "onnx-int8":
+        pytest.importorskip("onnxruntime")
+    backend = load_backend(name, model, tmp_path / f"model.{name}")
+    report = check(backend, model, game)
+    assert report["top_move_agreement"] > 0.9
+
+
+def test_int8_backend_calibrates_once(tmp_path, monkeypatch):
+    path = tmp_path / "model.int8"
+    first = load_backend("int8", model, path)
+    assert path.exists()
+
+    def calibrate(*args, **kwargs):
+        raise AssertionError("calibrated again")
+
+    monkeypatch.setattr(quantize, "selfplay_positions", calibrate)
+    second = load_backend("int8", model, path)
+    encoded = torch.tensor(game.get_encoded_state(sample_positions(game)))
+    with torch.no_grad():
+        for expected, actual in zip(first(encoded), second(encoded)):
+            assert torch.equal(expected, actual)
+
+
+def test_engine_loads_once_with_memory_mapped_weights():
+    assert engine.load_engine()["hard"] is checkpoint
+    startup = checkpoint.startup
+    assert startup["total"] >= startup["load"] + startup["warmup"]
+    if model.device.type == "cpu" and Path("/proc/self/maps").exists():
+        maps = Path("/proc/self/maps").read_text()
+        assert str((engine.model_dir / "model_27.pt").resolve()) in maps
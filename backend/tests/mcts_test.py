@@ -0,0 +1,206 @@
+import time
+
+import numpy as np
+
+from mcts_engine.mcts import MCTS
+from mcts_engine.parallel import RootParallelMCTS
+from mcts_engine.rollout import rollout_batch
+from mcts_engine.tree import Tree
+from sidestacker import SideStacker
+
+game = SideStacker()
+args = {"C": 1.41, "num_searches": 300}
+
+
+def test_search_takes_immediate_win():
+    state = game.get_initial_state()
+    state[2, :3] = 1
+    state[5, :3] = -1
+    probs = MCTS(game, args).search(state)
+    assert int(np.argmax(probs)) == 2 * 7 + 3
+
+
+def test_search_blocks_opponent_win():
+    # Every move but (4, 3) hands -1 an immediate win, which the solver
+    # proves, so the block does not hang on rollout luck.
+    state = game.get_initial_state()
+    state[4, 4:] = -1
+    state[0, 0] = 1
+    state[6, 6] = 1
+    probs = MCTS(game, {**args, "seed": 0, "solver": True}).search(state)
+    assert int(np.argmax(probs)) == 4 * 7 + 3
+
+
+def test_batched_rollouts_find_immediate_win():
+    state = game.get_initial_state()
+    state[2, :3] = 1
+    state[5, :3] = -1
+    probs = MCTS(game, {**args, "rollout_batch": 32}).search(state)
+    assert int(np.argmax(probs)) == 2 * 7 + 3
+
+
+def last_move_state():
+    # Only (6, 6) is empty; it completes a diagonal for whoever plays it.
+    return np.array(
+        [
+            [1, 1, -1, -1, 1, -1, 1],
+            [-1, -1, -1, 1, 1, -1, 1],
+            [-1, 1, -1, 1, -1, 1, -1],
+            [1, -1, 1, 1, -1, -1, -1],
+            [-1, -1, 1, -1, 1, -1, 1],
+            [1, 1, -1, -1, -1, 1, -1],
+            [-1, 1, -1, 1, 1, 1, 0],
+        ],
+        dtype=np.int8,
+    )
+
+
+def test_rollout_batch_scores_last_move():
+    state = last_move_state()
+    rng = np.random.default_rng(0)
+    assert np.all(rollout_batch(game, np.repeat(state[None], 4, axis=0), rng) == 1)
+    assert np.all(rollout_batch(game, np.repeat(-state[None], 4, axis=0), rng) == 0)
+
+
+def test_rollout_batch_never_plays_illegal_move_on_zero_draws():
+    class ZeroRNG:
+        def random(self, shape, dtype):
+            return np.zeros(shape, dtype=dtype)
+
+    # Candidate 0, the left end of the full row 0, is illegal; equal draws of
+    # 0.0 must still pick the one legal move rather than it.
+    assert rollout_batch(game, last_move_state()[None], ZeroRNG())[0] == 1
+
+
+def test_root_visits_cover_every_simulation():
+    state = game.get_initial_state()
+    probs = MCTS(game, args).search(state)
+    assert np.isclose(probs.sum(), 1)
+    assert set(np.flatnonzero(probs)) <= set(np.flatnonzero(game.get_valid_moves()))
+
+
+def test_tree_merges_statistics_for_transpositions():
+    tree = Tree.for_searches(4)
+    root = tree.add_root(key=0)
+    tree.add_children(root, [0, 6])
+    left, right = tree.expand(root), tree.expand(root)
+    tree.set_key(left, key=1)
+    tree.set_key(right, key=1)
+    tree.backpropagate([root, left], 1.0)
+    tree.backpropagate([root, right], -1.0)
+    assert tree.visit_count[left] == tree.visit_count[right] == 1
+    assert tree.stat[left] == tree.stat[right]
+    assert tree.stat_visits[tree.stat[left]] == 2
+    assert tree.visit_count[root] == 2
+
+
+def test_extract_keeps_subtree_statistics():
+    state = game.get_initial_state()
+    mcts = MCTS(game, args)
+    tree = mcts.new_tree(state)
+    mcts.search(state, tree)
+
+    child = max(
+        range(tree.first_child[0], tree.first_child[0] + tree.num_children[0]),
+        key=lambda node: tree.visit_count[node],
+    )
+    subtree = tree.extract(child, args["num_searches"])
+    assert subtree.visit_count[0] == tree.visit_count[child]
+    assert subtree.num_children[0] == tree.num_children[child]
+    assert subtree.stat_values[subtree.stat[0]] == tree.stat_values[tree.stat[child]]
+
+    next_state = game.get_next_state(state.copy(), tree.action[child], 1)
+    next_state = game.change_perspective(next_state, -1)
+    mcts.search(next_state, subtree)
+    assert subtree.visit_count[0] == tree.visit_count[child] + args["num_searches"]
+
+
+def test_engine_reuses_tree_after_reply():
+    from mcts_engine import engine
+
+    board = [[None] * 7 for _ in range(7)]
+    (row, col), searches, visits = engine.mcts_engine(board, "X", game_id=-1)
+    assert searches == engine.args["num_searches"] == visits.sum()
+    board[row][col] = "O"
+    reply = next((i, j) for i in range(7) for j in (0, 6) if board[i][j] is None)
+    board[reply[0]][reply[1]] = "X"
+
+    _, first_tree, _ = engine.trees.get(-1)
+    engine.mcts_engine(board, "X", game_id=-1)
+    _, second_tree, _ = engine.trees.get(-1)
+    assert second_tree is not first_tree
+    assert second_tree.visit_count[0] > engine.args["num_searches"]
+
+
+def test_root_parallel_search_merges_worker_visits():
+    state = game.get_initial_state()
+    state[2, :3] = 1
+    state[5, :3] = -1
+    pool = RootParallelMCTS(game, {**args, "workers": 2}).start()
+    try:
+        probs = pool.search(state)
+    finally:
+        pool.shutdown()
+    assert np.isclose(probs.sum(), 1)
+    assert int(np.argmax(probs)) == 2 * 7 + 3
+
+
+def test_threaded_search_shares_one_tree():
+    state = game.get_initial_state()
+    state[2, :3] = 1
+    state[5, :3] = -1
+    mcts = MCTS(game, {**args, "threads": 4, "rollout_batch": 8})
+    tree = mcts.new_tree(state)
+    visits, searches = mcts.search_visits(state, tree)
+    assert visits.sum() == searches == args["num_searches"]
+    assert int(np.argmax(visits)) == 2 * 7 + 3
+    assert tree.stat_visits[0] == tree.visit_count[0] == args["num_searches"]
+
+
+def test_deadline_stops_search_early():
+    state = game.get_initial_state()
+    mcts = MCTS(game, {**args, "num_searches": 100_000, "rollout_batch": 16})
+    start = time.monotonic()
+    visits, searches = mcts.search_visits(state, deadline=start + 0.05)
+    assert time.monotonic() - start < 1
+    assert 0 < searches < 100_000
+    assert visits.sum() == searches
+
+    _, searches = mcts.search_visits(state, deadline=start)
+    assert searches == 16
+
+
+def test_early_stop():
+    mcts = MCTS(game, {**args, "num_searches": 2000, "early_stop": True})
+    state = game.get_initial_state()
+    state[2, :3] = 1
+    state[5, :3] = -1
+    visits, searches = mcts.search_visits(state)
+    assert searches == 0 and int(np.argmax(visits)) == 2 * 7 + 3
+
+    state = game.get_initial_state()
+    state[4, 4:] = -1
+    state[0, 0] = 1
+    state[6, 6] = 1
+    tree = mcts.new_tree(state)
+    visits, searches = mcts.search_visits(state, tree)
+    assert searches < 2000 and int(np.argmax(visits)) == 4 * 7 + 3
+    assert tree.is_decided(2000 - searches)
+
+
+def forced_win_state():
+    # The player to move wins in three plies with 28, but not immediately.
+    position = game.get_position(game.get_initial_state())
+    for action in (35, 41, 21, 7, 22, 20):
+        position.play(action)
+    return position.to_board()
+
+
+def test_solver_proves_forced_win():
+    state = forced_win_state()
+    mcts = MCTS(game, {**args, "num_searches": 3000, "solver": True})
+    tree = mcts.new_tree(state)
+    visits, searches = mcts.search_visits(state, tree)
+    assert tree.proven[0] == 1
+    assert searches < 3000
+    assert int(np.argmax(visits)) == 28
@@ -0,0 +1,59 @@
+import threading
+
+import pytest
+
+from alphazero_engine.registry import Checkpoint, ModelRegistry
+
+
+def make_registry(tmp_path, levels):
+    for version in (2, 10, 27):
+        (tmp_path / f"model_{version}.pt").touch()
+    (tmp_path / "model_27.onnx").touch()
+    loads = []
+
+    def load(name, path):
+        loads.append(name)
+        return Checkpoint(name, path, None, None, None, {})
+
+    return ModelRegistry(tmp_path, load, levels), loads
+
+
+def test_resolves_checkpoints_by_name_or_version(tmp_path):
+    registry, _ = make_registry(tmp_path, {})
+    assert registry.available() == ["model_2", "model_10", "model_27"]
+    assert registry.resolve(27) == "model_27"
+    assert registry.resolve("10") == "model_10"
+    assert registry.resolve("model_2.pt") == "model_2"
+    with pytest.raises(ValueError):
+        registry.resolve("../model_27")
+
+
+def test_levels_share_one_checkpoint(tmp_path):
+    registry, loads = make_registry(tmp_path, {"hard": "27", "medium": "model_27"})
+    assert registry.get("hard") is registry.get("medium")
+    assert loads == ["model_27"]
+    assert registry.status()["levels"] == {"hard": "model_27", "medium": "model_27"}
+    with pytest.raises(KeyError):
+        registry.get("easy")
+
+
+def test_assign_swaps_level_and_drops_unused_checkpoints(tmp_path):
+    registry, loads = make_registry(tmp_path, {"hard": "model_27", "medium": "2"})
+    hard, medium = registry.get("hard"), registry.get("medium")
+    assert registry.assign("medium", 10) is registry.get("medium")
+    assert registry.get("hard") is hard
+    assert registry.status()["loaded"] == ["model_10", "model_27"]
+    # A search still holding the old checkpoint keeps its reference.
+    assert medium.name == "model_2"
+    assert registry.assign("medium", 2) is not medium
+    assert loads == ["model_27", "model_2", "model_10", "model_2"]
+
+
+def test_concurrent_first_requests_load_once(tmp_path):
+    registry, loads = make_registry(tmp_path, {"hard": "model_27"})
+    threads = [threading.Thread(target=registry.get, args=("hard",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == ["model_27"]
@@ -0,0 +1,270 @@
+import threading
+
+import numpy as np
+
+from sidestacker import SideStacker, TranspositionTable, bitboard, symmetry, zobrist
+
+game = SideStacker()
+
+
+def naive_valid_moves(state):
+    mask = np.zeros((7, 7), dtype=np.uint8)
+    for i, row in enumerate(state):
+        zero_indices = np.flatnonzero(row == 0)
+        if zero_indices.size:
+            mask[i, zero_indices[0]] = 1
+            mask[i, zero_indices[-1]] = 1
+    return mask.flatten()
+
+
+def naive_check_win(state, action):
+    i, j = divmod(action, 7)
+    player = state[i, j]
+    if player == 0:
+        return False
+    for di, dj in [(0, 1), (1, 0), (1, 1), (-1, 1)]:
+        count = 1
+        for sign in [1, -1]:
+            x, y = i + sign * di, j + sign * dj
+            while 0 <= x < 7 and 0 <= y < 7 and state[x, y] == player:
+                count += 1
+                x += sign * di
+                y += sign * dj
+        if count >= 4:
+            return True
+    return False
+
+
+def random_states(count, seed=0):
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        state = game.get_initial_state()
+        player = 1
+        while True:
+            action = rng.choice(np.flatnonzero(naive_valid_moves(state)))
+            state = game.get_next_state(state, action, player)
+            yield state.copy(), action
+            if naive_check_win(state, action) or not (state == 0).any():
+                break
+            player = -player
+
+
+def test_valid_moves_match_row_scan():
+    for state, _ in random_states(50):
+        moves = game.get_valid_moves(state)
+        assert moves.dtype == np.uint8
+        assert np.array_equal(moves, naive_valid_moves(state))
+
+
+def test_check_win_matches_cell_walk():
+    for state, _ in random_states(50, seed=1):
+        for action in range(game.action_size):
+            assert game.check_win(state, action) == naive_check_win(state, action)
+
+
+def test_check_win_ignores_lines_not_through_action():
+    state = game.get_initial_state()
+    state[0, :4] = 1
+    state[6, 6] = 1
+    assert game.check_win(state, 2)
+    assert not game.check_win(state, 48)
+
+
+def test_lines_do_not_wrap_between_rows():
+    state = game.get_initial_state()
+    state[0, 5:7] = 1
+    state[1, 0:2] = 1
+    for action in (5, 6, 7, 8):
+        assert not game.check_win(state, action)
+
+
+def test_full_board_is_terminal():
+    state = np.array(
+        [
+            [-1, -1, -1, 1, -1, 1, -1],
+            [1, -1, -1, -1, 1, -1, -1],
+            [1, -1, 1, 1, 1, -1, 1],
+            [1, 1, -1, -1, -1, 1, -1],
+            [-1, 1, 1, 1, -1, -1, 1],
+            [1, -1, -1, -1, 1, -1, 1],
+            [-1, -1, 1, -1, 1, 1, 1],
+        ],
+        dtype=np.int8,
+    )
+    assert not game.get_valid_moves(state).any()
+    assert not any(game.check_win(state, action) for action in range(49))
+    assert game.get_value_and_terminated(state, 0) == (0, True)
+
+
+def test_wins_if_played_skips_occupied_cells():
+    state = game.get_initial_state()
+    state[3, :3] = 1
+    state[3, 3] = -1
+    state[4, :3] = 1
+    cells = np.array([3 * 7 + 3, 4 * 7 + 3])
+    # (3, 3) would finish 1's row but -1 holds it; (4, 3) is open.
+    assert game.wins_if_played(state, cells, 1).tolist() == [False, True]
+    assert not game.wins_if_played(state, cells, -1).any()
+
+
+def test_bitboard_round_trip():
+    for state, _ in random_states(10, seed=2):
+        bits = bitboard.from_board(state == 1)
+        assert np.array_equal(bitboard.to_mask(bits), (state == 1).flatten())
+        assert bitboard.from_board(state != 0).bit_count() == (state != 0).sum()
+
+
+def test_batch_api_matches_single_board_api():
+    pairs = list(random_states(20, seed=3))
+    states = np.stack([state for state, _ in pairs])
+    actions = np.array([action for _, action in pairs])
+
+    valid = game.get_valid_moves_batch(states)
+    wins = game.check_win_batch(states, actions)
+    values, terminated = game.get_value_and_terminated_batch(states, actions)
+    for index, (state, action) in enumerate(pairs):
+        assert np.array_equal(valid[index], game.get_valid_moves(state))
+        assert wins[index] == game.check_win(state, action)
+        value, is_terminal = game.get_value_and_terminated(state, action)
+        assert (values[index], terminated[index]) == (value, is_terminal)
+
+    encoded = game.get_encoded_state(states)
+    assert encoded.shape == (len(states), 3, 7, 7)
+    assert np.array_equal(encoded[5], game.get_encoded_state(states[5]))
+
+
+def test_next_state_batch():
+    states = np.zeros((3, 7, 7), dtype=np.int8)
+    game.get_next_state_batch(states, np.array([0, 6, 48]), np.array([1, -1, 1]))
+    assert states[0, 0, 0] == 1 and states[1, 0, 6] == -1 and states[2, 6, 6] == 1
+    assert np.count_nonzero(states) == 3
+
+
+def test_winning_and_blocking_moves_match_trial_placement():
+    for state, _ in random_states(30, seed=4):
+        for player in (1, -1):
+            expected = np.zeros(49, dtype=np.uint8)
+            for action in np.flatnonzero(naive_valid_moves(state)):
+                trial = state.copy()
+                trial.flat[action] = player
+                expected[action] = naive_check_win(trial, action)
+            assert np.array_equal(game.winning_moves(state, player), expected)
+            assert np.array_equal(game.blocking_moves(state, -player), expected)
+
+
+def test_win_line_tables():
+    assert game.win_lines.shape == (88, 4)
+    for cell in range(49):
+        lines = {tuple(line) for line in game.cell_lines[cell]}
+        expected = {tuple(line) for line in game.win_lines if cell in line}
+        assert lines == expected
+
+
+def test_position_tracks_moves_through_play_and_undo():
+    rng = np.random.default_rng(5)
+    for _ in range(30):
+        state = game.get_initial_state()
+        position = game.get_position(state)
+        boards = []
+        while True:
+            assert sorted(position.moves) == list(
+                np.flatnonzero(game.get_valid_moves(state))
+            )
+            assert position.empty == np.count_nonzero(state == 0)
+            boards.append(state.copy())
+            action = rng.choice(position.moves)
+            state = game.get_next_state(state, action, position.player)
+            expected_hash = position.canonical_hash_after(action)
+            position.play(action)
+            assert position.canonical_hash == expected_hash
+            assert position.hash == zobrist.hash_board(state, position.player)
+            outcome = position.get_value_and_terminated()
+            assert outcome == game.get_value_and_terminated(state, action)
+            if outcome[1]:
+                break
+
+        rebuilt = game.get_position(state, position.player)
+        assert sorted(rebuilt.moves) == sorted(position.moves)
+        assert rebuilt.empty == position.empty
+
+        while position.history:
+            position.undo()
+            board = boards.pop()
+            assert sorted(position.moves) == list(
+                np.flatnonzero(game.get_valid_moves(board))
+            )
+        assert position.stones == {1: 0, -1: 0} and position.player == 1
+        assert position.keys == 0
+
+
+def test_transpositions_share_a_hash():
+    left_first = game.get_position(game.get_initial_state())
+    for action in (0, 48, 6, 42):
+        left_first.play(action)
+    right_first = game.get_position(game.get_initial_state())
+    for action in (6, 42, 0, 48):
+        right_first.play(action)
+    assert left_first.hash == right_first.hash
+
+
+def test_transposition_table_is_bounded_lru():
+    table = TranspositionTable(capacity=2)
+    first = table.lookup(1)
+    table.lookup(2)
+    assert table.lookup(1) is first
+    table.lookup(3)
+    assert len(table) == 2 and 2 not in table.entries
+    assert table.stats()["hits"] == 1 and table.stats()["misses"] == 3
+
+
+def test_transposition_entries_count_concurrent_updates():
+    table = TranspositionTable(capacity=4)
+    entry = table.lookup(1)
+
+    def update():
+        for _ in range(10_000):
+            table.add(entry, 1, 0.5)
+
+    threads = [threading.Thread(target=update) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert entry.visit_count == 40_000 and entry.value_sum == 20_000
+
+
+def test_mirror_images_share_canonical_form():
+    for state, action in random_states(10, seed=6):
+        canonical, _ = game.get_canonical_state(state)
+        hashes = set()
+        for index in range(symmetry.SYMMETRIES):
+            image = symmetry.transform_board(state, index)
+            image_canonical, image_symmetry = game.get_canonical_state(image)
+            assert np.array_equal(image_canonical, canonical)
+            assert np.array_equal(
+                symmetry.transform_board(image, image_symmetry), canonical
+            )
+            hashes.add(game.get_canonical_hash(image))
+
+            mapped = game.transform_action(action, index)
+            assert image.flat[mapped] == state.flat[action]
+            assert np.array_equal(
+                game.transform_policy(game.get_valid_moves(state), index),
+                game.get_valid_moves(image),
+            )
+        assert len(hashes) == 1
+
+
+def test_canonical_state_matches_position_symmetry():
+    for state, action in random_states(50, seed=7):
+        position = game.get_position(state)
+        key, index = position.canonical_symmetry
+        canonical, canonical_index = game.get_canonical_state(state)
+        assert canonical_index == index
+        assert game.get_canonical_hash(canonical) == key
+        mapped = game.transform_action(action, index)
+        assert canonical.flat[mapped] == state.flat[action]
+        assert np.array_equal(
+            game.transform_policy(game.get_valid_moves(state), index),
+            game.get_valid_moves(canonical),
+        )
@@ -0,0 +1,343 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from engine_worker import Job, UnixSocketTransport
+from engine_worker import service as service_module
+from engine_worker.executor import EngineBusy, EngineExecutor, JobExpired
+from engine_worker.results import ResultCache
+from engine_worker.service import EngineService
+from engine_worker.transport import SocketInUse, serve_unix
+
+
+def wait_for(event, result=None):
+    event.wait(5)
+    return result
+
+
+def test_run_returns_result_off_the_event_loop():
+    pool = EngineExecutor(ThreadPoolExecutor, 1, 0)
+
+    async def main():
+        return await pool.run(threading.get_ident)
+
+    try:
+        assert asyncio.run(main()) != threading.get_ident()
+    finally:
+        pool.shutdown()
+    assert pool.pending == 0
+
+
+def test_full_queue_is_busy_and_waiting_runs_by_priority():
+    pool = EngineExecutor(ThreadPoolExecutor, 1, 2)
+    release = threading.Event()
+
+    async def main():
+        running = asyncio.create_task(pool.run(wait_for, release, "first"))
+        await asyncio.sleep(0.05)
+        low = asyncio.create_task(pool.run(wait_for, release, "low", priority=1))
+        high = asyncio.create_task(pool.run(wait_for, release, "high", priority=0))
+        await asyncio.sleep(0.05)
+        with pytest.raises(EngineBusy):
+            await pool.run(wait_for, release)
+        finished = []
+        for task in (running, low, high):
+            task.add_done_callback(lambda task: finished.append(task.result()))
+        release.set()
+        await asyncio.gather(running, low, high)
+        return finished
+
+    try:
+        assert asyncio.run(main()) == ["first", "high", "low"]
+    finally:
+        pool.shutdown()
+    assert pool.pending == 0
+
+
+def test_search_expires_while_waiting():
+    pool = EngineExecutor(ThreadPoolExecutor, 1, 1)
+    release = threading.Event()
+
+    async def main():
+        running = asyncio.create_task(pool.run(wait_for, release))
+        await asyncio.sleep(0.05)
+        waiting = pool.run(wait_for, release, deadline=time.monotonic() + 0.01)
+        waiting = asyncio.create_task(waiting)
+        await asyncio.sleep(0.05)
+        release.set()
+        await running
+        with pytest.raises(JobExpired):
+            await waiting
+
+    try:
+        asyncio.run(main())
+    finally:
+        pool.shutdown()
+
+
+def test_search_with_a_free_worker_runs_past_its_deadline():
+    pool = EngineExecutor(ThreadPoolExecutor, 1, 1)
+
+    async def main():
+        return await pool.run(int, 7, deadline=time.monotonic() - 1)
+
+    try:
+        assert asyncio.run(main()) == 7
+    finally:
+        pool.shutdown()
+
+
+def test_zero_time_limit_still_returns_a_move():
+    from app.main import get_job
+    from app.models import GameState
+
+    service = EngineService()
+    service.pools["mcts"] = EngineExecutor(ThreadPoolExecutor, 1, 1)
+    state = GameState(board=[[None] * 7 for _ in range(7)], player_symbol="X")
+    state.time_limit = 0
+    job = get_job("mcts", state, 1.0, None, "medium")
+    assert job.budget > 0
+
+    try:
+        result = asyncio.run(service.search(job))
+    finally:
+        service.shutdown()
+    assert result["status"] == "ok" and result["searches"] >= 1
+
+
+def test_client_disconnect_cancels_pending_reply(monkeypatch):
+    from fastapi import HTTPException
+
+    from app import engines
+
+    cancelled = []
+
+    class HangingTransport:
+        async def request(self, message):
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.append(message)
+                raise
+
+    class GoneRequest:
+        async def is_disconnected(self):
+            return True
+
+    monkeypatch.setattr(engines, "transport", HangingTransport())
+    monkeypatch.setattr(engines, "DISCONNECT_POLL", 0.01)
+
+    async def main():
+        with pytest.raises(HTTPException) as error:
+            await engines.send({"type": "search"}, GoneRequest())
+        # Already cancelled when send returns, not left to the loop.
+        assert cancelled == [{"type": "search"}]
+        return error.value.status_code
+
+    assert asyncio.run(main()) == 499
+
+
+def test_cancel_stops_running_search():
+    pool = EngineExecutor(ThreadPoolExecutor, 1, 1, cancellable=True)
+    cancel_seen = []
+
+    def search(cancel):
+        cancel.wait(5)
+        cancel_seen.append(cancel.is_set())
+
+    async def main():
+        task = asyncio.create_task(pool.run(search))
+        await asyncio.sleep(0.05)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0.05)
+
+    try:
+        asyncio.run(main())
+    finally:
+        pool.shutdown()
+    assert cancel_seen == [True]
+    assert pool.pending == 0
+
+
+def test_shutdown_cancels_waiting_searches():
+    pool = EngineExecutor(ThreadPoolExecutor, 1, 2)
+    release = threading.Event()
+
+    async def main():
+        running = asyncio.create_task(pool.run(wait_for, release))
+        await asyncio.sleep(0.05)
+        waiting = [asyncio.create_task(pool.run(wait_for, release)) for _ in range(2)]
+        await asyncio.sleep(0.05)
+        release.set()
+        pool.shutdown()
+        for task in waiting:
+            with pytest.raises(asyncio.CancelledError):
+                await task
+        await running
+
+    asyncio.run(main())
+    assert not pool.waiting
+
+
+class StubService:
+    def __init__(self):
+        self.cancelled = asyncio.Event()
+
+    async def handle(self, message):
+        if message["op"] == "ping":
+            return {"status": "ok"}
+        if message["op"] == "search":
+            job = Job.from_dict(message["job"])
+            return {"status": "ok", "move": [3, 0], "searches": job.game_id}
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            self.cancelled.set()
+            raise
+
+
+def test_unix_socket_round_trip_and_withdraw(tmp_path):
+    path = str(tmp_path / "engine.sock")
+
+    async def main():
+        service = StubService()
+        transport = UnixSocketTransport(path)
+        async with serve_unix(service, path):
+            await transport.start()
+            job = Job.with_budget("mcts", [[None] * 7] * 7, "O", 1.0, game_id=7)
+            reply = await transport.request({"op": "search", "job": job.to_dict()})
+            assert reply == {"status": "ok", "move": [3, 0], "searches": 7}
+
+            slow = asyncio.create_task(transport.request({"op": "slow"}))
+            await asyncio.sleep(0.05)
+            slow.cancel()
+            await asyncio.wait_for(service.cancelled.wait(), 1)
+
+    asyncio.run(main())
+
+
+def test_second_service_leaves_the_socket_alone(tmp_path):
+    path = str(tmp_path / "engine.sock")
+
+    async def main():
+        transport = UnixSocketTransport(path)
+        async with serve_unix(StubService(), path):
+            with pytest.raises(SocketInUse):
+                async with serve_unix(StubService(), path):
+                    pass
+            assert await transport.ping()
+        assert not os.path.exists(path)
+        assert not await transport.ping()
+
+    asyncio.run(main())
+
+
+def test_job_deadline_follows_budget():
+    job = Job.from_dict(Job.with_budget("alphazero", [], "X", 2.0).to_dict())
+    assert 1.9 < job.deadline() - time.monotonic() <= 2.0
+    with pytest.raises(ValueError):
+        Job.with_budget("minimax", [], "X", 1.0)
+
+
+def test_result_cache_persists_with_ttl(tmp_path):
+    path = str(tmp_path / "results.json")
+    cache = ResultCache(8, ttl=60, path=path)
+    cache.put("mcts:mcts:1:ab", (np.arange(49), 100))
+    cache.save()
+
+    restored = ResultCache(8, ttl=60, path=path)
+    restored.load()
+    visits, searches = restored.get("mcts:mcts:1:ab")
+    assert searches == 100 and visits.tolist() == list(range(49))
+
+    time.sleep(0.05)
+    expired = ResultCache(8, ttl=0.01, path=path)
+    expired.load()
+    assert len(expired) == 0
+
+
+def test_service_caches_mirror_images_and_coalesces(monkeypatch):
+    calls = []
+
+    def search(board, player_symbol, game_id, deadline):
+        calls.append(game_id)
+        time.sleep(0.05)
+        visits = np.zeros(49)
+        visits[2 * 7 + 1] = 10
+        return (2, 1), 10, visits
+
+    monkeypatch.setattr(service_module, "mcts_engine", search)
+    service = EngineService()
+    service.pools["mcts"] = EngineExecutor(ThreadPoolExecutor, 1, 4)
+    board = [[None] * 7 for _ in range(7)]
+    board[2][0] = "X"
+    mirror = [row[::-1] for row in board]
+
+    async def main():
+        jobs = [Job.with_budget("mcts", board, "X", 1.0) for _ in range(2)]
+        first, second = await asyncio.gather(*map(service.search, jobs))
+        hit = await service.search(Job.with_budget("mcts", mirror, "X", 1.0))
+        return first, second, hit
+
+    try:
+        first, second, hit = asyncio.run(main())
+    finally:
+        service.shutdown()
+    assert calls == [None]
+    assert first["move"] == second["move"] == [2, 1]
+    assert not first["cached"] and not second["cached"]
+    assert hit == {"status": "ok", "move": [2, 5], "searches": 0, "cached": True}
+
+
+def test_identical_searches_from_two_games_each_store_a_tree():
+    from mcts_engine import engine
+
+    service = EngineService()
+    service.pools["mcts"] = EngineExecutor(ThreadPoolExecutor, 2, 2)
+    board = [[None] * 7 for _ in range(7)]
+
+    async def main():
+        jobs = [
+            Job.with_budget("mcts", board, "X", 0.2, game_id=game_id)
+            for game_id in (-21, -22)
+        ]
+        return await asyncio.gather(*map(service.search, jobs))
+
+    try:
+        results = asyncio.run(main())
+    finally:
+        service.shutdown()
+    assert all(result["searches"] > 0 for result in results)
+    assert engine.trees.get(-21) is not None
+    assert engine.trees.get(-22) is not None
+
+
+def test_withdrawn_shared_search_is_not_joined():
+    service = EngineService()
+    calls = []
+
+    async def search():
+        calls.append(len(calls))
+        await asyncio.sleep(0.05)
+        return {"status": "ok", "search": calls[-1]}
+
+    async def main():
+        first = asyncio.create_task(service.shared("key", search))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        # The withdrawn search may not have finished cancelling yet.
+        return await service.shared("key", search)
+
+    try:
+        assert asyncio.run(main()) == {"status": "ok", "search": 1}
+    finally:
+        service.shutdown()
+    assert calls == [0, 1] and not service.inflight
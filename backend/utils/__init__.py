@@ -1,5 +1,6 @@
+from .cache import LRUCache
 from .utils import generateFruitname
 from .fruits import fruits
 from .names import names
 
-__all__ = ["generateFruitname", "fruits", "names"]
+__all__ = ["LRUCache", "generateFruitname", "fruits", "names"]
@@ -0,0 +1,68 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, maxsize: int, ttl: float | None = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self._take(key, default, remove=False)
+
+    def pop(self, key, default=None):
+        with self.lock:
+            return self._take(key, default, remove=True)
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _take(self, key, default, remove: bool):
+        item = self.entries.get(key)
+        if (
+            item is not None
+            and self.ttl is not None
+            and time.monotonic() - item[0] > self.ttl
+        ):
+            del self.entries[key]
+            item = None
+
+        if item is None:
+            self.misses += 1
+            return default
+
+        self.hits += 1
+        if remove:
+            del self.entries[key]
+        else:
+            self.entries.move_to_end(key)
+        return item[1]